@@ -145,6 +145,41 @@ STATIFILES_DIR = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
+# Snapshots columnares de los Excel de media/xlsx
+DATASET_SNAPSHOT_ROOT = os.path.join(BASE_DIR,'cache','datasets')
+# Cada cuántos segundos se revisan los Excel de media/xlsx (0 desactiva el watcher)
+DATASET_WATCH_INTERVAL = float(os.getenv('DATASET_WATCH_INTERVAL', '5'))
+# Segundos que las solicitudes reutilizan la lista de libros de run-off (el watcher la renueva antes)
+DATASET_CATALOG_TTL = float(os.getenv('DATASET_CATALOG_TTL', '30'))
+# Memoria máxima (MB) de los datasets cargados a la vez; se sueltan los menos usados
+DATASET_MEMORY_BUDGET = int(os.getenv('DATASET_MEMORY_BUDGET_MB', '512')) * 1024 * 1024
+# Caché compartida entre procesos (L2) y cachés por proceso (L1) de core.utils.TieredCache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR,'cache','shared'),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+TIERED_CACHES = {
+    # Catálogo de libros (hojas y esquema) por versión del archivo
+    'datasets': {'L1_BYTES': 8 * 1024 * 1024, 'L2': 'shared', 'TIMEOUT': None},
+    # Páginas renderizadas de reportes guardados
+    'reports': {'L1_BYTES': int(os.getenv('REPORT_CACHE_L1_MB', '32')) * 1024 * 1024, 'L2': 'shared', 'TIMEOUT': 3600},
+}
+# Similitud mínima para aceptar un cliente en la búsqueda difusa
+CLIENT_MATCH_CUTOFF = 0.3
+# Plazo (segundos) para el resumen con IA de un reporte antes de usar el texto por defecto
+REPORT_SUMMARY_TIMEOUT = float(os.getenv('REPORT_SUMMARY_TIMEOUT', '8'))
+REPORT_SUMMARY_WORKERS = int(os.getenv('REPORT_SUMMARY_WORKERS', '8'))
+# Contexto de conversación que se envía en el prompt de intención
+CHAT_CONTEXT_TOKENS = 800
+CHAT_CONTEXT_TURNS = 10
+CHAT_CONTEXT_TURN_CHARS = 400
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 #AUTHENTICATION
@@ -166,4 +201,8 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_PATH': '/',
     'AUTH_COOKIE_SAMESITE': 'Lax',
     'AUTH_COOKIE': 'access_token', 
-}
\ No newline at end of file
+}
+# Resolver el usuario desde los claims del token (sin consultar la tabla User)
+JWT_STATELESS_USER = os.getenv('JWT_STATELESS_USER', 'True') == 'True'
+# Segundos que cada proceso confía en la versión de token cacheada de un usuario
+JWT_PRINCIPAL_CACHE_TTL = float(os.getenv('JWT_PRINCIPAL_CACHE_TTL', '60'))
\ No newline at end of file
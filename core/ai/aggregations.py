@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Agrupaciones disponibles: nombre -> (columna de origen, etiqueta en el resultado)
+GROUPINGS = {
+    "weekmonth": ("weekmonth", "weekmonth"),
+    "product": ("Producto", "Producto"),
+    "month": ("Fecha Venc.Cuota", "Mes"),
+    "currency": ("Moneda", "Moneda"),
+}
+
+# Sinónimos que puede devolver el modelo o escribir el usuario
+GROUPING_ALIASES = {
+    "semana": "weekmonth", "semanas": "weekmonth", "week": "weekmonth",
+    "producto": "product", "productos": "product", "products": "product",
+    "mes": "month", "meses": "month", "mensual": "month", "months": "month",
+    "moneda": "currency", "monedas": "currency", "divisa": "currency", "divisas": "currency",
+}
+
+VALUE_COLUMNS = ("Capital", "Capital L/P", "Capital Divisa")
+COUNT_COLUMN = "Registros"
+MISSING_LABEL = "Sin dato"
+
+
+def normalize_grouping(value) -> Optional[str]:
+    """Nombre canónico de la agrupación, o None si no se reconoce"""
+    if not value:
+        return None
+    key = str(value).strip().lower()
+    if key in GROUPINGS:
+        return key
+    return GROUPING_ALIASES.get(key)
+
+
+class AggregationEngine:
+    """
+    Sumas y conteos de Capital agrupados, calculados con np.bincount sobre
+    códigos enteros precalculados por columna. Se construye una vez por
+    versión del dataset y guarda los resultados por (cliente, producto,
+    agrupación) en un LRU acotado.
+    """
+
+    def __init__(self, frame: pd.DataFrame, max_entries: int = 512):
+        self.frame = frame
+        self.value_columns = tuple(column for column in VALUE_COLUMNS if column in frame.columns)
+        self.max_entries = max_entries
+        self._codes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._values: Dict[str, np.ndarray] = {}
+        self._results: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def available(self) -> Tuple[str, ...]:
+        return tuple(name for name, (column, _) in GROUPINGS.items() if column in self.frame.columns)
+
+    def _build_codes(self, grouping: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Códigos por fila (-1 = nulo) y etiquetas de cada código"""
+        series = self.frame[GROUPINGS[grouping][0]]
+        if grouping == "month":
+            months = series.to_numpy(dtype="datetime64[M]")
+            valid = ~np.isnat(months)
+            uniques, inverse = np.unique(months[valid], return_inverse=True)
+            codes = np.full(len(months), -1, dtype=np.int32)
+            codes[valid] = inverse
+            return codes, np.datetime_as_string(uniques, unit="M").astype(object)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Las columnas del snapshot ya son categóricas: se reutilizan sus códigos
+            return series.cat.codes.to_numpy().astype(np.int32), series.cat.categories.astype(str).to_numpy(dtype=object)
+        codes, uniques = pd.factorize(series, sort=True)
+        return codes.astype(np.int32), np.asarray(uniques.astype(str), dtype=object)
+
+    def _get_codes(self, grouping: str) -> Tuple[np.ndarray, np.ndarray]:
+        codes = self._codes.get(grouping)
+        if codes is None:
+            codes = self._codes[grouping] = self._build_codes(grouping)
+        return codes
+
+    def _get_values(self, column: str) -> np.ndarray:
+        # Vista sobre la columna del snapshot (mmap), sin copia privada: los NaN
+        # se descartan al sumar, solo sobre las filas seleccionadas
+        values = self._values.get(column)
+        if values is None:
+            values = self._values[column] = self.frame[column].to_numpy(dtype=np.float64, copy=False)
+        return values
+
+    def aggregate(self, grouping: str, rows=slice(None), key: Optional[tuple] = None) -> pd.DataFrame:
+        """
+        Agrupa las filas indicadas (slice o arreglo de posiciones). Si se
+        pasa key, el resultado se cachea bajo esa clave.
+        """
+        if grouping not in GROUPINGS:
+            raise ValueError(f"Agrupación no soportada: {grouping}. Use {', '.join(GROUPINGS)}")
+        if GROUPINGS[grouping][0] not in self.frame.columns:
+            raise ValueError(f"Columna {GROUPINGS[grouping][0]} no encontrada")
+
+        cache_key = (grouping, key) if key is not None else None
+        if cache_key is not None:
+            with self._lock:
+                cached = self._results.get(cache_key)
+                if cached is not None:
+                    self._results.move_to_end(cache_key)
+                    return cached
+
+        with self._lock:
+            codes, labels = self._get_codes(grouping)
+            values = {column: self._get_values(column) for column in self.value_columns}
+
+        # El código -1 (nulo) pasa al bucket 0; el resto se desplaza en uno
+        selected = codes[rows].astype(np.intp) + 1
+        size = len(labels) + 1
+        counts = np.bincount(selected, minlength=size)
+        keep = np.flatnonzero(counts)
+        # Los nulos van al final
+        keep = np.r_[keep[keep > 0], keep[keep == 0]]
+
+        label = GROUPINGS[grouping][1]
+        all_labels = np.r_[np.array([MISSING_LABEL], dtype=object), labels]
+        result = {label: all_labels[keep], COUNT_COLUMN: counts[keep]}
+        for column, column_values in values.items():
+            weights = column_values[rows]
+            valid = ~np.isnan(weights)
+            sums = np.bincount(selected[valid], weights=weights[valid], minlength=size)
+            result[column] = np.round(sums[keep], 2)
+        frame = pd.DataFrame(result)
+
+        if cache_key is not None:
+            with self._lock:
+                self._results[cache_key] = frame
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return frame
@@ -0,0 +1,63 @@
+import html
+import re
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+_TAGS = re.compile(r"<[^>]+>")
+_TABLES = re.compile(r"<table.*?</table>", re.S | re.I)
+_SPACES = re.compile(r"\s+")
+
+
+def strip_html(text: str) -> str:
+    """Quita tablas y etiquetas HTML y colapsa espacios"""
+    text = _TABLES.sub(" ", text or "")
+    text = html.unescape(_TAGS.sub(" ", text))
+    return _SPACES.sub(" ", text).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximación habitual: ~4 caracteres por token
+    return max(1, len(text) // 4)
+
+
+class ConversationContext:
+    """
+    Resumen acotado de los últimos turnos de un chat. Se guarda en
+    Chat.context y se actualiza en cada mensaje, así que armar el prompt
+    no requiere volver a consultar el historial.
+    """
+
+    def __init__(self, turns: Optional[List[Dict]] = None, token_budget: int = None,
+                 max_turns: int = None, max_turn_chars: int = None):
+        self.turns: List[Dict] = list(turns or [])
+        self.token_budget = token_budget or settings.CHAT_CONTEXT_TOKENS
+        self.max_turns = max_turns or settings.CHAT_CONTEXT_TURNS
+        self.max_turn_chars = max_turn_chars or settings.CHAT_CONTEXT_TURN_CHARS
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Dict]) -> "ConversationContext":
+        """Reconstruye el contexto desde mensajes en orden cronológico (chats previos)"""
+        context = cls()
+        for message in messages:
+            context.add(message.get("sender", "unknown"), message.get("message_text", ""))
+        return context
+
+    def add(self, sender: str, text: str):
+        text = strip_html(text)
+        if len(text) > self.max_turn_chars:
+            text = text[:self.max_turn_chars - 1].rstrip() + "…"
+        if not text:
+            return
+        if self.turns and self.turns[-1]["sender"] == sender and self.turns[-1]["text"] == text:
+            return
+        self.turns.append({"sender": sender, "text": text, "tokens": estimate_tokens(text)})
+        self._trim()
+
+    def _trim(self):
+        total = sum(turn["tokens"] for turn in self.turns)
+        while self.turns and (len(self.turns) > self.max_turns or total > self.token_budget):
+            total -= self.turns.pop(0)["tokens"]
+
+    def render(self) -> str:
+        return "\n".join(f"{turn['sender']}: {turn['text']}" for turn in self.turns)
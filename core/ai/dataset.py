@@ -0,0 +1,523 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from core.utils.SingleFlight import SingleFlight
+
+from .aggregations import AggregationEngine
+from .indexes import DateIndex, GroupIndex
+from .schema import schema_for
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Cambiar este número invalida todos los snapshots existentes
+SNAPSHOT_FORMAT = 3
+META_FILE = "meta.json"
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """Identifica una versión concreta de un archivo fuente"""
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+_fingerprint_lock = threading.Lock()
+_fingerprints: Dict[str, tuple] = {}
+
+
+def file_fingerprint(file_path) -> FileFingerprint:
+    """
+    Calcula la huella (mtime, tamaño, sha1) del archivo.
+    El sha1 solo se recalcula cuando cambian mtime o tamaño.
+    """
+    path = str(file_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Archivo no encontrado: {path}")
+    stat = os.stat(path)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            sha1.update(chunk)
+    fingerprint = FileFingerprint(stat.st_mtime_ns, stat.st_size, sha1.hexdigest())
+    with _fingerprint_lock:
+        _fingerprints[path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+    return fingerprint
+
+
+def projection(columns: Optional[Sequence[str]]) -> tuple:
+    """Forma canónica de una proyección de columnas (vacía = todas)"""
+    return tuple(sorted({str(column) for column in columns})) if columns else ()
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_").lower() or "x"
+
+
+class ExcelSnapshot:
+    """
+    Convierte una hoja de Excel en un snapshot columnar (un .npy por columna)
+    para no volver a parsear el .xlsx mientras el archivo no cambie.
+    """
+
+    def __init__(self, file_path, sheet_name: str, sort_by: Sequence[str] = (), root=None,
+                 columns: Optional[Sequence[str]] = None):
+        self.file_path = Path(file_path)
+        self.sheet_name = sheet_name
+        self.sort_by = tuple(sort_by)
+        self.root = Path(root or settings.DATASET_SNAPSHOT_ROOT)
+        # Proyección: solo estas columnas se parsean y se guardan (None = todas)
+        self.columns = projection(columns) or None
+
+    def _source_prefix(self) -> str:
+        return f"{_slug(self.file_path.stem)}-"
+
+    def path_for(self, fingerprint: FileFingerprint) -> Path:
+        name = _slug(self.sheet_name)
+        if self.sort_by:
+            name = f"{name}-by-{_slug('-'.join(self.sort_by))}"
+        if self.columns:
+            digest = hashlib.sha1("\0".join(self.columns).encode("utf-8")).hexdigest()[:10]
+            name = f"{name}-cols-{digest}"
+        return self.root / f"{self._source_prefix()}{fingerprint.digest[:20]}" / name
+
+    def load(self, fingerprint: Optional[FileFingerprint] = None, mmap: bool = False) -> pd.DataFrame:
+        """
+        Carga el snapshot vigente, construyéndolo si no existe.
+        Con mmap=True las columnas se mapean en modo solo lectura y todos
+        los procesos comparten las mismas páginas del page cache.
+        """
+        fingerprint = fingerprint or file_fingerprint(self.file_path)
+        target = self.path_for(fingerprint)
+        meta = self._read_meta(target)
+        if meta is None:
+            with self._build_lock():
+                # Otro proceso pudo haberlo construido mientras esperábamos
+                meta = self._read_meta(target)
+                if meta is None:
+                    # Snapshot inexistente o de un formato anterior
+                    shutil.rmtree(target, ignore_errors=True)
+                    self.build(fingerprint)
+                    meta = self._read_meta(target)
+        return self._read_frame(target, meta, mmap)
+
+    @contextmanager
+    def _build_lock(self):
+        """Evita que varios workers conviertan el mismo Excel a la vez"""
+        if fcntl is None:
+            yield
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f".{self._source_prefix()}lock", "w") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def build(self, fingerprint: FileFingerprint) -> Path:
+        """Parsea el Excel y escribe el snapshot de forma atómica"""
+        target = self.path_for(fingerprint)
+        wanted = set(self.columns or ())
+        df = pd.read_excel(
+            self.file_path,
+            sheet_name=self.sheet_name,
+            usecols=(lambda name: str(name) in wanted) if wanted else None,
+        )
+        schema = schema_for(self.sheet_name)
+        if schema is not None:
+            # Tipos declarados: categorías, decimales y fechas; si no cumple, SchemaError
+            df = schema.apply(df)
+        sort_by = [column for column in self.sort_by if column in df.columns]
+        if sort_by:
+            # Orden estable: las filas de un mismo grupo quedan contiguas
+            df = df.sort_values(sort_by, kind="stable", na_position="last", ignore_index=True)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=target.parent))
+        try:
+            columns = [self._write_column(tmp_dir, i, name, df[name]) for i, name in enumerate(df.columns)]
+            meta = {
+                "format": SNAPSHOT_FORMAT,
+                "source": str(self.file_path),
+                "sheet": self.sheet_name,
+                "mtime_ns": fingerprint.mtime_ns,
+                "digest": fingerprint.digest,
+                "rows": len(df),
+                "sort_by": sort_by,
+                "projection": list(self.columns or ()),
+                "columns": columns,
+            }
+            with open(tmp_dir / META_FILE, "w", encoding="utf-8") as fh:
+                json.dump(meta, fh, ensure_ascii=False)
+            try:
+                os.rename(tmp_dir, target)
+            except OSError:
+                # Otro proceso publicó el mismo snapshot primero
+                if self._read_meta(target) is None:
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._prune_stale(target.parent)
+        return target
+
+    def _write_column(self, directory: Path, position: int, name, series: pd.Series) -> Dict:
+        filename = f"c{position}.npy"
+        column = {"name": str(name), "file": filename}
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            column["kind"] = "numeric"
+            values = series.to_numpy()
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            column["kind"] = "datetime"
+            if series.dt.tz is not None:
+                series = series.dt.tz_localize(None)
+            values = series.to_numpy(dtype="datetime64[ns]")
+        else:
+            # Texto o tipos mezclados: se guardan como categoría (códigos + valores)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                categorical = series.cat.rename_categories(series.cat.categories.astype(str)).array
+            else:
+                categorical = pd.Categorical(series.where(series.isna(), series.astype(str)))
+            column["kind"] = "category"
+            column["categories"] = categorical.categories.tolist()
+            values = categorical.codes.astype(np.int32)
+        np.save(directory / filename, np.ascontiguousarray(values), allow_pickle=False)
+        return column
+
+    @staticmethod
+    def _read_meta(directory: Path) -> Optional[Dict]:
+        try:
+            with open(directory / META_FILE, encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("format") == SNAPSHOT_FORMAT else None
+
+    @staticmethod
+    def _read_frame(directory: Path, meta: Dict, mmap: bool = False) -> pd.DataFrame:
+        data = {}
+        for column in meta["columns"]:
+            values = np.load(directory / column["file"], mmap_mode="r" if mmap else None, allow_pickle=False)
+            if column["kind"] == "category":
+                dtype = pd.CategoricalDtype(column["categories"])
+                values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+            data[column["name"]] = values
+        return pd.DataFrame(data, copy=False)
+
+    def _prune_stale(self, current: Path):
+        """Elimina snapshots de versiones anteriores del mismo archivo"""
+        prefix = self._source_prefix()
+        for entry in self.root.iterdir():
+            if entry.is_dir() and entry.name.startswith(prefix) and entry != current:
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+class DatasetVersion:
+    """
+    Versión publicada de una hoja: un objeto inmutable que se comparte por
+    referencia entre todas las solicitudes del proceso. Las columnas son
+    arreglos mapeados en memoria de solo lectura; los índices se calculan
+    una sola vez por versión y las consultas reciben vistas o solo las
+    filas del resultado, nunca una copia del dataset.
+    """
+
+    def __init__(self, source: str, sheet_name: str, fingerprint: FileFingerprint, frame: pd.DataFrame):
+        set_attribute = super().__setattr__
+        set_attribute("source", source)
+        set_attribute("sheet_name", sheet_name)
+        set_attribute("fingerprint", fingerprint)
+        set_attribute("frame", frame)
+        set_attribute("columns", tuple(frame.columns))
+        set_attribute("_derived", {})
+        # Reentrante: una estructura derivada puede depender de otra
+        set_attribute("_lock", threading.RLock())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DatasetVersion es de solo lectura")
+
+    def __delattr__(self, name):
+        raise AttributeError("DatasetVersion es de solo lectura")
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def version(self) -> str:
+        return self.fingerprint.digest
+
+    def derive(self, name: str, builder):
+        """Calcula (una sola vez por versión) una estructura derivada del dataset"""
+        value = self._derived.get(name)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self._derived.get(name)
+            if value is None:
+                value = builder(self.frame)
+                self._derived[name] = value
+        return value
+
+    @property
+    def metadata(self) -> "DatasetMetadata":
+        return self.derive("metadata", DatasetMetadata)
+
+    @property
+    def group_index(self) -> GroupIndex:
+        return self.derive("group_index", GroupIndex)
+
+    @property
+    def aggregations(self) -> AggregationEngine:
+        return self.derive("aggregations", AggregationEngine)
+
+    def date_index(self, date_column: str, client_column: Optional[str] = "Empresa") -> DateIndex:
+        return self.derive(
+            f"date_index:{date_column}:{client_column or 'all'}",
+            lambda frame: DateIndex(frame, date_column, client_column)
+        )
+
+    def view(self, rows=slice(None), columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Filas y columnas pedidas. Un slice devuelve vistas de las columnas;
+        un arreglo de posiciones copia solo esas filas de esas columnas.
+        """
+        names = [name for name in (columns or self.columns) if name in self.columns]
+        if isinstance(rows, slice):
+            data = {name: self.frame[name].array[rows] for name in names}
+            index = self.frame.index[rows]
+        else:
+            rows = np.asarray(rows)
+            data = {name: self.frame[name].array.take(rows) for name in names}
+            index = self.frame.index.take(rows)
+        return pd.DataFrame(data, index=index, columns=names, copy=False)
+
+
+class DatasetMetadata:
+    """
+    Valores calculados una sola vez por versión del dataset: listas de
+    clientes y productos y estadísticas por columna.
+    """
+
+    def __init__(self, frame: pd.DataFrame, client_column: str = "Empresa", product_column: str = "Producto"):
+        self.columns = tuple(frame.columns)
+        self.rows = len(frame)
+        self.clients = self._distinct(frame, client_column)
+        self.products = self._distinct(frame, product_column)
+        self.column_stats = {name: self._stats(frame[name]) for name in frame.columns}
+
+    @staticmethod
+    def _distinct(frame: pd.DataFrame, column: str) -> tuple:
+        if column not in frame.columns:
+            return ()
+        return tuple(frame[column].dropna().unique().tolist())
+
+    @staticmethod
+    def _stats(series: pd.Series) -> Dict:
+        nulls = int(series.isna().sum())
+        stats = {"dtype": str(series.dtype), "count": len(series) - nulls, "nulls": nulls}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            stats["distinct"] = len(series.cat.categories)
+        elif pd.api.types.is_datetime64_any_dtype(series) and stats["count"]:
+            stats["min"] = series.min().isoformat()
+            stats["max"] = series.max().isoformat()
+        elif pd.api.types.is_numeric_dtype(series) and stats["count"]:
+            stats["min"] = float(series.min())
+            stats["max"] = float(series.max())
+            stats["sum"] = float(series.sum())
+        return stats
+
+
+class DatasetStore:
+    """
+    Registro por proceso de las versiones adjuntas. Cada worker mapea el
+    mismo snapshot en disco, por lo que no mantiene copias privadas.
+
+    Tras la primera carga se sirve la versión vigente aunque el archivo haya
+    cambiado (stale-while-revalidate): la nueva versión se prepara en un hilo
+    y se publica al terminar. Las cargas concurrentes de una misma hoja se
+    agrupan en una sola.
+
+    Las versiones se mantienen en un LRU acotado por memory_budget (bytes):
+    al superarlo se sueltan las menos usadas. Volver a cargarlas solo mapea
+    su snapshot, y las solicitudes en curso conservan su referencia.
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None):
+        self.memory_budget = memory_budget
+        self._versions: "OrderedDict[tuple, DatasetVersion]" = OrderedDict()
+        self._sizes: Dict[tuple, int] = {}
+        self._lru_lock = threading.Lock()
+        # (mtime_ns, tamaño) del archivo al publicar o al fallar cada clave
+        self._stats: Dict[tuple, tuple] = {}
+        self._failed: Dict[tuple, tuple] = {}
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _stat(file_path) -> Optional[tuple]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, file_path, sheet_name: str = "DETALLE", sort_by: Sequence[str] = (),
+            columns: Optional[Sequence[str]] = None) -> DatasetVersion:
+        """Versión vigente de la hoja; con columns, solo esa proyección (cada una se carga aparte)"""
+        key = (str(file_path), sheet_name, tuple(sort_by), projection(columns))
+        current = self._versions.get(key)
+        if current is None:
+            # Arranque en frío: los llamadores concurrentes esperan una sola carga
+            return self._flight.do(key, lambda: self._load(key))
+        with self._lru_lock:
+            if key in self._versions:
+                self._versions.move_to_end(key)
+        stat = self._stat(file_path)
+        if stat is not None and stat != self._stats.get(key) and stat != self._failed.get(key):
+            self._flight.background(key, lambda: self._load(key))
+        return current
+
+    def _load(self, key: tuple) -> DatasetVersion:
+        file_path, sheet_name, sort_by, columns = key
+        stat = self._stat(file_path)
+        try:
+            fingerprint = file_fingerprint(file_path)
+            current = self._versions.get(key)
+            if current is None or current.fingerprint.digest != fingerprint.digest:
+                frame = ExcelSnapshot(file_path, sheet_name, sort_by, columns=columns).load(fingerprint, mmap=True)
+                current = DatasetVersion(file_path, sheet_name, fingerprint, frame)
+                self._publish(key, current)
+        except Exception:
+            # No se reintenta hasta que el archivo vuelva a cambiar
+            self._failed[key] = stat
+            raise
+        self._stats[key] = (current.fingerprint.mtime_ns, current.fingerprint.size) if stat is None else stat
+        self._failed.pop(key, None)
+        return current
+
+    @staticmethod
+    def _frame_bytes(frame: pd.DataFrame) -> int:
+        return int(frame.memory_usage(index=False, deep=False).sum())
+
+    def _publish(self, key: tuple, version: DatasetVersion):
+        with self._lru_lock:
+            self._versions[key] = version
+            self._versions.move_to_end(key)
+            self._sizes[key] = self._frame_bytes(version.frame)
+            if not self.memory_budget:
+                return
+            while len(self._versions) > 1 and sum(self._sizes.values()) > self.memory_budget:
+                evicted, _ = self._versions.popitem(last=False)
+                self._sizes.pop(evicted, None)
+                self._stats.pop(evicted, None)
+
+    def refresh_changed(self):
+        """Recarga en el hilo actual las hojas cuyo archivo cambió desde la última publicación"""
+        for key in list(self._versions):
+            stat = self._stat(key[0])
+            if stat is not None and stat != self._stats.get(key) and stat != self._failed.get(key):
+                try:
+                    self._flight.do(key, lambda: self._load(key))
+                except Exception:
+                    pass
+
+    def loaded_layouts(self) -> set:
+        """(hoja, orden, proyección) ya cargados, para preparar snapshots de archivos nuevos"""
+        return {key[1:] for key in list(self._versions)}
+
+    def stats(self) -> Dict:
+        with self._lru_lock:
+            loaded = [
+                {
+                    "source": key[0], "sheet": key[1], "columns": list(version.columns),
+                    "version": version.version, "bytes": self._sizes.get(key, 0),
+                }
+                for key, version in self._versions.items()
+            ]
+        return {
+            "versions": len(loaded),
+            "bytes": sum(item["bytes"] for item in loaded),
+            "memory_budget": self.memory_budget,
+            "loaded": loaded,
+            "loads": self._flight.stats(),
+        }
+
+
+class DatasetWatcher:
+    """
+    Hilo que revisa por polling (mtime y tamaño) los libros de run-off del
+    catálogo y renueva la lista que usan las solicitudes. Las versiones cargadas que cambian se reconstruyen fuera del camino de
+    las solicitudes y se publican con un reemplazo atómico; los archivos
+    nuevos dejan su snapshot preparado.
+    """
+
+    def __init__(self, store: DatasetStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._seen: Dict[str, tuple] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True, name="dataset-watcher")
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                pass
+
+    def poll(self):
+        # La lista de run-off del catálogo se renueva aquí, fuera de las solicitudes
+        from .registry import dataset_registry
+        workbooks = dataset_registry.refresh()
+        self.store.refresh_changed()
+        layouts = self.store.loaded_layouts()
+        if not layouts:
+            return
+        # Solo los libros de run-off: los demás Excel del directorio no tienen la hoja a cargar
+        for info in workbooks:
+            stat = DatasetStore._stat(info.path)
+            if stat is None or self._seen.get(info.path) == stat:
+                continue
+            self._seen[info.path] = stat
+            for sheet_name, sort_by, columns in layouts:
+                try:
+                    ExcelSnapshot(info.path, sheet_name, sort_by, columns=columns).load(file_fingerprint(info.path))
+                except Exception:
+                    pass
+
+
+dataset_store = DatasetStore(getattr(settings, "DATASET_MEMORY_BUDGET", None))
+dataset_watcher = DatasetWatcher(dataset_store, getattr(settings, "DATASET_WATCH_INTERVAL", 0))
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+from typing import Optional
+
+import pandas as pd
+
+MONTHS = {
+    "enero": 1, "ene": 1,
+    "febrero": 2, "feb": 2,
+    "marzo": 3, "mar": 3,
+    "abril": 4, "abr": 4,
+    "mayo": 5, "may": 5,
+    "junio": 6, "jun": 6,
+    "julio": 7, "jul": 7,
+    "agosto": 8, "ago": 8,
+    "septiembre": 9, "setiembre": 9, "sep": 9, "sept": 9, "set": 9,
+    "octubre": 10, "oct": 10,
+    "noviembre": 11, "nov": 11,
+    "diciembre": 12, "dic": 12,
+}
+
+_ISO = re.compile(r"^(\d{4})-(\d{1,2})(?:-(\d{1,2}))?(?:[ t].*)?$")
+_NUMERIC = re.compile(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})$")
+_MONTH_YEAR_NUMERIC = re.compile(r"^(\d{1,2})[/.-](\d{4})$")
+_TEXT = re.compile(r"^(?:(\d{1,2})\s+(?:de\s+)?)?([a-z]+)\.?(?:\s+(?:de\s+|del\s+)?(\d{4}))?$")
+_YEAR = re.compile(r"^(?:ano\s+|del\s+)?(\d{4})$")
+
+
+def _clean(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower().strip()
+    return re.sub(r"\s+", " ", text.replace(",", " "))
+
+
+def _bound(year: int, month: int, day: Optional[int], end: bool) -> pd.Timestamp:
+    """Inicio (o último día si end) del día, mes o año indicado"""
+    if day is not None:
+        return pd.Timestamp(year=year, month=month, day=day)
+    start = pd.Timestamp(year=year, month=month, day=1)
+    return start + pd.offsets.MonthEnd(0) if end else start
+
+
+def parse_date(value, end: bool = False, today: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    """
+    Convierte la fecha que devuelve el modelo a Timestamp. Acepta ISO,
+    dd/mm/aaaa y texto en español ("15 de mayo de 2025", "mayo 2025",
+    "2025", "hoy"). Si la fecha es un mes o un año y end=True, devuelve el
+    último día del periodo. None si el valor está vacío.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.normalize()
+    text = _clean(value)
+    if text in ("null", "none", "n/a"):
+        return None
+    today = (today or pd.Timestamp.today()).normalize()
+
+    try:
+        if text == "hoy":
+            return today
+        if text == "manana":
+            return today + pd.Timedelta(days=1)
+        if text == "ayer":
+            return today - pd.Timedelta(days=1)
+
+        match = _ISO.match(text)
+        if match:
+            year, month, day = match.groups()
+            return _bound(int(year), int(month), int(day) if day else None, end)
+
+        match = _NUMERIC.match(text)
+        if match:
+            day, month, year = (int(part) for part in match.groups())
+            if year < 100:
+                year += 2000
+            return _bound(year, month, day, end)
+
+        match = _MONTH_YEAR_NUMERIC.match(text)
+        if match:
+            return _bound(int(match.group(2)), int(match.group(1)), None, end)
+
+        match = _YEAR.match(text)
+        if match:
+            year = int(match.group(1))
+            return pd.Timestamp(year=year, month=12, day=31) if end else pd.Timestamp(year=year, month=1, day=1)
+
+        match = _TEXT.match(text)
+        if match and match.group(2) in MONTHS:
+            day, month_name, year = match.groups()
+            return _bound(int(year) if year else today.year, MONTHS[month_name], int(day) if day else None, end)
+    except ValueError:
+        pass
+    raise ValueError(f"Fecha no reconocida: {value}")
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _group_bounds(keys: np.ndarray):
+    """Devuelve (inicio, fin) de cada tramo de claves iguales en un arreglo ordenado"""
+    if len(keys) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    stops = np.r_[starts[1:], len(keys)]
+    return starts, stops
+
+
+class GroupIndex:
+    """
+    Tabla de offsets sobre un frame ordenado por cliente y producto.
+    Filtrar por cliente (y producto) pasa a ser una búsqueda en un
+    diccionario seguida de un slice, en lugar de recorrer todas las filas.
+    """
+
+    def __init__(self, frame: pd.DataFrame, client_column: str = "Empresa", product_column: Optional[str] = "Producto"):
+        if client_column not in frame.columns:
+            raise ValueError('Columna empresa no encontrada')
+        if not isinstance(frame[client_column].dtype, pd.CategoricalDtype):
+            raise ValueError(f"La columna {client_column} debe ser categórica para indexarse")
+        clients = frame[client_column].cat
+        client_codes = clients.codes.to_numpy()
+        categories = clients.categories
+
+        self.clients: Dict[str, Tuple[int, int]] = {}
+        starts, stops = _group_bounds(client_codes)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            code = client_codes[start]
+            if code >= 0:
+                self.clients[categories[code]] = (start, stop)
+
+        self.products: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.client_products: Dict[str, List[str]] = {}
+        self.has_products = bool(product_column) and product_column in frame.columns \
+            and isinstance(frame[product_column].dtype, pd.CategoricalDtype)
+        if self.has_products:
+            products = frame[product_column].cat
+            product_codes = products.codes.to_numpy().astype(np.int64)
+            # Clave combinada cliente/producto (los nulos, código -1, quedan como grupo propio)
+            keys = client_codes.astype(np.int64) * (len(products.categories) + 1) + (product_codes + 1)
+            starts, stops = _group_bounds(keys)
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                client_code, product_code = client_codes[start], product_codes[start]
+                if client_code >= 0 and product_code >= 0:
+                    client, product = categories[client_code], products.categories[product_code]
+                    self.products[(client, product)] = (start, stop)
+                    self.client_products.setdefault(client, []).append(product)
+
+    def client_range(self, client_name: str, product: Optional[str] = None) -> Tuple[int, int]:
+        """Rango [inicio, fin) de filas del cliente; (0, 0) si no existe.
+        El producto solo se considera si el índice lo incluye (has_products)."""
+        if product and self.has_products:
+            return self.products.get((client_name, product), (0, 0))
+        return self.clients.get(client_name, (0, 0))
+
+    def client_stats(self, client_name: str, product: Optional[str] = None) -> Optional[Dict]:
+        """
+        Cantidad de filas y productos del cliente sin materializar el
+        filtro. None si el índice no puede responder (producto sin indexar).
+        """
+        if product and not self.has_products:
+            return None
+        start, stop = self.client_range(client_name, product)
+        if product:
+            products = [product] if stop > start else []
+        else:
+            products = list(self.client_products.get(client_name, []))
+        return {"total_records": stop - start, "products": products}
+
+
+class DateIndex:
+    """
+    Posiciones de filas ordenadas por fecha dentro de cada cliente (o de
+    todo el frame si no se agrupa). Un rango de fechas se resuelve con dos
+    searchsorted sobre el tramo del cliente, en O(log n).
+    """
+
+    def __init__(self, frame: pd.DataFrame, date_column: str, client_column: Optional[str] = "Empresa"):
+        if date_column not in frame.columns:
+            raise ValueError(f"Columna {date_column} no encontrada")
+        dates = frame[date_column].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if client_column:
+            # El frame está ordenado por cliente: cada tramo es un bloque contiguo
+            starts, stops = _group_bounds(frame[client_column].cat.codes.to_numpy())
+            blocks = np.repeat(np.arange(len(starts)), stops - starts)
+        else:
+            blocks = np.zeros(len(dates), dtype=np.int64)
+        self.order = np.lexsort((dates, blocks))
+        self.sorted_dates = dates[self.order]
+
+    def positions(self, start: int, stop: int, date_from: Optional[pd.Timestamp] = None,
+                  date_to: Optional[pd.Timestamp] = None) -> np.ndarray:
+        """
+        Posiciones (en el orden del frame) de las filas de [start, stop) con
+        fecha entre date_from y date_to, ambos días inclusive. NaT queda fuera.
+        """
+        block = self.sorted_dates[start:stop]
+        # NaT es el mínimo de int64; empezar en min + 1 lo excluye
+        low = np.iinfo(np.int64).min + 1 if date_from is None else pd.Timestamp(date_from).normalize().value
+        lo = np.searchsorted(block, low, side="left")
+        if date_to is None:
+            hi = len(block)
+        else:
+            high = (pd.Timestamp(date_to).normalize() + pd.Timedelta(days=1)).value
+            hi = np.searchsorted(block, high, side="left")
+        return np.sort(self.order[start + lo:start + max(lo, hi)])
@@ -0,0 +1,153 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .dates import MONTHS
+from .matching import normalize_name
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Mensajes que son solo un saludo, agradecimiento o despedida
+_SMALL_TALK = [
+    (re.compile(r"^(hola|buenas|buenos dias|buenas tardes|buenas noches|hey|saludos)( a todos)?$"),
+     "¡Hola! ¿En qué puedo ayudarte hoy? Puedo generar reportes de run-off por cliente."),
+    (re.compile(r"^(muchas )?gracias( por (todo|la ayuda|el reporte))?$|^(ok|okay|vale|perfecto|genial|listo)( gracias)?$"),
+     "¡De nada! Si necesitas otro reporte, indícame el cliente."),
+    (re.compile(r"^(adios|chau|chao|hasta luego|nos vemos|hasta pronto)$"),
+     "¡Hasta luego! Aquí estaré cuando necesites otro reporte."),
+]
+
+_REPORT = re.compile(r"\b(reporte|reportes|informe|run ?off|cronograma|vencimientos|cuotas|detalle)\b")
+_CLIENT_INFO = re.compile(r"\b(info|informacion|quien es|que productos|cuantos registros)\b")
+# Fechas, referencias al contexto, negaciones o pedidos compuestos: los resuelve el modelo
+_AMBIGUOUS = re.compile(
+    r"\b(sin|excepto|salvo|menos|no|ni|excluye|excluyendo|excluir|"
+    r"desde|hasta|entre|antes|despues|ultimo|ultima|ultimos|proximo|proxima|anterior|mismo|misma|ese|esa|"
+    r"tambien|compara|comparar|filtra|filtrar|solo|ahora|hoy|ayer|manana|ano|semana|trimestre|"
+    r"\d{1,4}|" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b"
+)
+_GROUP_BY = [
+    (re.compile(r"\bpor (mes|meses)\b|\bmensual\b"), "month"),
+    (re.compile(r"\bpor (semana|semanas|weekmonth)\b"), "weekmonth"),
+    (re.compile(r"\bpor (producto|productos)\b"), "product"),
+    (re.compile(r"\bpor (moneda|monedas|divisa|divisas)\b"), "currency"),
+]
+# Palabras que no identifican por sí solas a un cliente
+_STOPWORDS = {"de", "del", "la", "el", "los", "las", "y", "banco", "grupo", "empresa", "cliente", "sur", "norte"}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+class ClientNameIndex:
+    """
+    Detección directa de nombres de cliente en un mensaje: cada nombre
+    normalizado es una secuencia de tokens indexada por su primer token,
+    así que el mensaje se recorre una sola vez.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._by_first: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for name in names:
+            tokens = tuple(normalize_name(name).split())
+            if not tokens or (len(tokens) == 1 and (len(tokens[0]) < 4 or tokens[0] in _STOPWORDS)):
+                continue
+            self._by_first.setdefault(tokens[0], []).append((tokens, name))
+        for candidates in self._by_first.values():
+            candidates.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def find(self, tokens: List[str]) -> List[str]:
+        """Nombres contenidos en la secuencia de tokens (coincidencia más larga primero)"""
+        found = []
+        position = 0
+        while position < len(tokens):
+            matched = 0
+            for candidate, name in self._by_first.get(tokens[position], ()):
+                if tuple(tokens[position:position + len(candidate)]) == candidate:
+                    if name not in found:
+                        found.append(name)
+                    matched = len(candidate)
+                    break
+            position += matched or 1
+        return found
+
+
+class IntentRules:
+    """
+    Primera etapa del clasificador de intenciones: reglas locales que
+    resuelven los casos evidentes (saludos, reportes con el cliente escrito
+    completo) sin llamar al modelo. Devuelve un dict con la misma forma que
+    la respuesta JSON del LLM, o None si el mensaje es ambiguo.
+    """
+
+    def __init__(self, clients: Iterable[str], products: Iterable[str] = ()):
+        self.clients = ClientNameIndex(clients)
+        self.products = ClientNameIndex(products)
+
+    def classify(self, message: str) -> Optional[Dict]:
+        text = normalize_text(message)
+        if not text:
+            return None
+
+        for pattern, response_text in _SMALL_TALK:
+            if pattern.match(text):
+                return {"intent_type": "conversation", "confidence": 0.95, "entities": {}, "response_text": response_text}
+
+        group_by = None
+        for pattern, grouping in _GROUP_BY:
+            if pattern.search(text):
+                group_by = grouping
+                # "por semana" pide una agrupación, no un rango de fechas
+                text = pattern.sub(" ", text)
+                break
+        if _AMBIGUOUS.search(text):
+            return None
+        tokens = text.split()
+        clients = self.clients.find(tokens)
+        if len(clients) != 1:
+            return None
+        products = self.products.find(tokens)
+        if len(products) > 1:
+            return None
+        entities = {"client_name": clients[0]}
+        if products:
+            entities["product"] = products[0]
+
+        if _REPORT.search(text):
+            if group_by:
+                entities["group_by"] = group_by
+            return {"intent_type": "report_request", "confidence": 0.9, "entities": entities, "response_text": None}
+        if _CLIENT_INFO.search(text):
+            return {"intent_type": "client_info", "confidence": 0.9, "entities": entities, "response_text": None}
+        return None
+
+
+class TierMetrics:
+    """Contadores de qué etapa resolvió cada intención (local, llm, fallback)"""
+
+    TIERS = ("local", "llm", "fallback")
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.TIERS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, tier: str):
+        with self._lock:
+            self._counts[tier] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "counts": counts,
+            "hit_rate": {tier: round(count / total, 4) if total else 0.0 for tier, count in counts.items()},
+        }
+
+
+intent_metrics = TierMetrics()
@@ -0,0 +1,31 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ai.dataset import ExcelSnapshot, file_fingerprint
+from core.ai.views import ReportingService
+
+
+class Command(BaseCommand):
+    help = "Genera los snapshots columnares de los Excel de media/xlsx con el formato que leen las solicitudes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sheet", default="DETALLE", help="Hoja a convertir")
+
+    def handle(self, *args, **options):
+        directory = os.path.join(settings.MEDIA_ROOT, "xlsx")
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(".xlsx") or name.startswith("~$"):
+                continue
+            path = os.path.join(directory, name)
+            # Mismo orden y proyección que ReportingService: la primera solicitud no vuelve a parsear el Excel
+            snapshot = ExcelSnapshot(
+                path, options["sheet"], ReportingService.INDEX_COLUMNS, columns=ReportingService.DATASET_COLUMNS
+            )
+            try:
+                df = snapshot.load(file_fingerprint(path))
+            except ValueError as e:
+                self.stderr.write(f"{name}: {e}")
+                continue
+            self.stdout.write(f"{name}: {len(df)} filas")
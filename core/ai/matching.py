@@ -0,0 +1,83 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+# Sufijos societarios que no aportan a la búsqueda (ya sin puntos ni tildes)
+_LEGAL_SUFFIX = re.compile(
+    r"(\s+(s a a|s a c|s a|saa|sac|sa|s r l|srl|e i r l|eirl|s c r l|scrl|s de r l|ltda|ltd|inc|corp))+$"
+)
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text) -> str:
+    """Minúsculas, sin tildes, sin puntuación y sin sufijos como S.A. o S.A.C."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = _NON_ALNUM.sub(" ", text).strip()
+    return _LEGAL_SUFFIX.sub("", f" {text}").strip()
+
+
+def _ngrams(text: str, n: int = 3) -> Counter:
+    padded = f" {text} "
+    if len(padded) < n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class ClientMatcher:
+    """
+    Búsqueda difusa de clientes con un índice invertido de trigramas
+    ponderados por TF-IDF. Se construye una vez por versión del dataset;
+    cada consulta solo recorre las listas de los trigramas que contiene.
+    """
+
+    def __init__(self, client_list: Iterable, cutoff: Optional[float] = None):
+        self.clients: List[str] = [str(client) for client in client_list if client is not None and client == client]
+        self.normalized: List[str] = [normalize_name(client) for client in self.clients]
+        self.cutoff = getattr(settings, "CLIENT_MATCH_CUTOFF", 0.3) if cutoff is None else cutoff
+
+        grams_per_client = [_ngrams(name) for name in self.normalized]
+        document_frequency = Counter(gram for grams in grams_per_client for gram in grams)
+        total = len(self.clients)
+        self._idf = {gram: math.log((total + 1) / (count + 1)) + 1.0 for gram, count in document_frequency.items()}
+        self._unknown_idf = math.log(total + 1) + 1.0
+
+        postings = defaultdict(lambda: ([], []))
+        for position, grams in enumerate(grams_per_client):
+            weights = {gram: tf * self._idf[gram] for gram, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                postings[gram][0].append(position)
+                postings[gram][1].append(weight / norm)
+        self._postings = {
+            gram: (np.asarray(ids, dtype=np.int32), np.asarray(weights, dtype=np.float32))
+            for gram, (ids, weights) in postings.items()
+        }
+
+    def top_matches(self, search_text: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Devuelve hasta k candidatos (cliente, similitud coseno) ordenados por puntaje"""
+        if not self.clients or not search_text:
+            return []
+        grams = _ngrams(normalize_name(search_text))
+        weights = {gram: tf * self._idf.get(gram, self._unknown_idf) for gram, tf in grams.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        scores = np.zeros(len(self.clients), dtype=np.float32)
+        for gram, weight in weights.items():
+            posting = self._postings.get(gram)
+            if posting is not None:
+                scores[posting[0]] += posting[1] * (weight / norm)
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.clients[i], min(float(scores[i]), 1.0)) for i in candidates if scores[i] > 0]
+
+    def find_best_client_match(self, search_text: str) -> Optional[str]:
+        matches = self.top_matches(search_text, k=1)
+        if matches and matches[0][1] > self.cutoff:
+            return matches[0][0]
+        return None
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'created_at', 'id'], name='messages_chat_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0002_message_chat_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='context',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-16 23:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_chat_context'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_name', models.CharField(max_length=200, verbose_name='Cliente')),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('columns', models.JSONField(default=list)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='report', to='ai.message', verbose_name='Mensaje')),
+            ],
+            options={
+                'verbose_name': 'Reporte',
+                'verbose_name_plural': 'Reportes',
+                'db_table': 'report_artifacts',
+            },
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.forms import model_to_dict
+from .reports import decode_report
 # Create your models here.
 class Chat(models.Model):
     user = models.ForeignKey(User,on_delete=models.DO_NOTHING,verbose_name="Usuario")
     title = models.CharField(max_length=200,verbose_name="Titulo")
     created_at = models.DateTimeField(auto_now_add=True)
     update_at = models.DateField(auto_now=True)
+    # Turnos recientes compactados para el prompt (ver core.ai.context)
+    context = models.JSONField(default=list, blank=True)
     class Meta:
         verbose_name = "Chat"
         verbose_name_plural ="Chats"
@@ -24,7 +27,34 @@ class Message(models.Model):
         verbose_name = "Mensaje"
         verbose_name_plural = "Mensajes"
         db_table = "messages"
+        indexes = [
+            # Historial por chat en orden cronológico (paginación por cursor)
+            models.Index(fields=["chat", "created_at", "id"], name="messages_chat_created_idx"),
+        ]
     def toJSON(self):
         item = model_to_dict(self)
         item['chat_id'] = self.chat.id
-        return item
\ No newline at end of file
+        return item
+class ReportArtifact(models.Model):
+    """Resultado de un reporte en formato compacto, asociado al mensaje de la IA"""
+    message = models.OneToOneField(Message,on_delete=models.CASCADE,related_name="report",verbose_name="Mensaje")
+    client_name = models.CharField(max_length=200,verbose_name="Cliente")
+    filters = models.JSONField(default=dict,blank=True)
+    columns = models.JSONField(default=list)
+    row_count = models.PositiveIntegerField(default=0)
+    # JSON por columnas en bloques de filas comprimidos con zlib (ver core.ai.reports)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        verbose_name = "Reporte"
+        verbose_name_plural = "Reportes"
+        db_table = "report_artifacts"
+    def get_page(self, offset=0, limit=None):
+        return decode_report(self.columns, self.payload, offset, limit)
+    def toJSON(self):
+        return {
+            "id": self.id,
+            "client_name": self.client_name,
+            "row_count": self.row_count,
+            "columns": self.columns,
+        }
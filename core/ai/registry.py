@@ -0,0 +1,249 @@
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from openpyxl import load_workbook
+
+from core.utils.TieredCache import get_cache
+
+from .dataset import file_fingerprint
+from .dates import MONTHS, parse_date
+from .matching import ClientMatcher, normalize_name
+from .schema import RUNOFF_SCHEMA
+
+# Hoja y columnas mínimas para que un libro sirva como run-off
+RUNOFF_SHEET = RUNOFF_SCHEMA.sheet
+RUNOFF_COLUMNS = RUNOFF_SCHEMA.required
+# Filas que se leen para inferir el tipo de cada columna
+SCHEMA_SAMPLE_ROWS = 50
+
+# Esquema de cada libro por versión del archivo, compartido entre procesos
+dataset_cache = get_cache("datasets")
+
+_PERIOD = re.compile(r"(20\d{2})(0[1-9]|1[0-2])")
+
+
+@dataclass
+class SheetInfo:
+    name: str
+    rows: int
+    columns: List[Dict] = field(default_factory=list)
+
+    def has_columns(self, names) -> bool:
+        present = {column["name"] for column in self.columns}
+        return all(name in present for name in names)
+
+
+@dataclass
+class WorkbookInfo:
+    name: str
+    path: str
+    version: str
+    modified: str
+    size: int
+    period: Optional[str]
+    sheets: List[SheetInfo]
+
+    def sheet(self, name: str) -> Optional[SheetInfo]:
+        return next((sheet for sheet in self.sheets if sheet.name == name), None)
+
+    @property
+    def is_runoff(self) -> bool:
+        sheet = self.sheet(RUNOFF_SHEET)
+        return sheet is not None and sheet.has_columns(RUNOFF_COLUMNS)
+
+    def toJSON(self) -> Dict:
+        # La ruta en el servidor no se expone: el libro se identifica por nombre y versión
+        item = asdict(self)
+        del item["path"]
+        item["is_runoff"] = self.is_runoff
+        return item
+
+
+def _value_type(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, (datetime, date)):
+        return "date"
+    return "string"
+
+
+def _read_sheets(path: str) -> List[SheetInfo]:
+    """Encabezados, tipos (de una muestra) y cantidad de filas de cada hoja, sin cargar el libro"""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = []
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                sheets.append(SheetInfo(worksheet.title, 0))
+                continue
+            names = [str(value) if value is not None else f"col_{i}" for i, value in enumerate(header)]
+            types: List[Optional[str]] = [None] * len(names)
+            count = 0
+            for row in rows:
+                count += 1
+                if count <= SCHEMA_SAMPLE_ROWS:
+                    for i, value in enumerate(row[:len(names)]):
+                        kind = _value_type(value)
+                        if kind and types[i] != kind:
+                            types[i] = kind if types[i] is None else "string"
+                elif worksheet.max_row:
+                    # La hoja declara sus dimensiones: no hace falta recorrerla entera
+                    count = worksheet.max_row - 1
+                    break
+            columns = [{"name": name, "type": kind or "empty"} for name, kind in zip(names, types)]
+            sheets.append(SheetInfo(worksheet.title, count, columns))
+        return sheets
+    finally:
+        workbook.close()
+
+
+def _text_period(text) -> Optional[str]:
+    """Periodo AAAA-MM mencionado en el texto ("202504", "abril 2025", "2025-04")"""
+    match = _PERIOD.search(str(text))
+    if match:
+        return f"{match.group(1)}-{match.group(2)}"
+    tokens = normalize_name(text).split()
+    months = [MONTHS[token] for token in tokens if token in MONTHS]
+    years = [token for token in tokens if re.fullmatch(r"20\d{2}", token)]
+    if months and years:
+        return f"{years[0]}-{months[0]:02d}"
+    try:
+        return parse_date(text).strftime("%Y-%m")
+    except (ValueError, AttributeError):
+        return None
+
+
+class DatasetRegistry:
+    """
+    Catálogo de los libros Excel de un directorio (hojas, esquema, filas y
+    versión). El catálogo se relee solo para los archivos que cambiaron;
+    los datos se cargan recién al usarse, a través de dataset_store.
+    """
+
+    def __init__(self, directory, ttl: float = 30):
+        self.directory = str(directory)
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[tuple, WorkbookInfo]] = {}
+        # (directorio, vence, libros de run-off): lo que consultan las solicitudes
+        self._runoff: Optional[Tuple[str, float, List[WorkbookInfo]]] = None
+        self._lock = threading.Lock()
+
+    def catalog(self) -> List[WorkbookInfo]:
+        if not os.path.isdir(self.directory):
+            return []
+        workbooks = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.lower().endswith(".xlsx") or name.startswith("~$"):
+                continue
+            info = self._describe(os.path.join(self.directory, name))
+            if info is not None:
+                workbooks.append(info)
+        with self._lock:
+            present = {info.path for info in workbooks}
+            for path in [path for path in self._entries if path not in present]:
+                del self._entries[path]
+        return workbooks
+
+    def _describe(self, path: str) -> Optional[WorkbookInfo]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            fingerprint = file_fingerprint(path)
+            # Otro proceso puede haber leído ya esta versión del libro
+            sheets = dataset_cache.get_or_set(f"sheets:{fingerprint.digest}", lambda: _read_sheets(path))
+        except Exception:
+            return None
+        name = os.path.basename(path)
+        period = _PERIOD.search(name)
+        info = WorkbookInfo(
+            name=name,
+            path=path,
+            version=fingerprint.digest,
+            modified=datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+            size=stat.st_size,
+            period=f"{period.group(1)}-{period.group(2)}" if period else None,
+            sheets=sheets,
+        )
+        with self._lock:
+            self._entries[path] = (key, info)
+        return info
+
+    def refresh(self) -> List[WorkbookInfo]:
+        """Relee el directorio y actualiza la lista de run-off; la llama el watcher"""
+        directory = self.directory
+        workbooks = [info for info in self.catalog() if info.is_runoff]
+        with self._lock:
+            self._runoff = (directory, time.monotonic() + self.ttl, workbooks)
+        return workbooks
+
+    def runoff_workbooks(self) -> List[WorkbookInfo]:
+        """
+        Libros de run-off vistos en la última revisión del directorio. Con el
+        watcher activo la lista se renueva en segundo plano; si no, se relee
+        a lo sumo cada ttl segundos.
+        """
+        with self._lock:
+            cached = self._runoff
+        if cached is not None and cached[0] == self.directory and cached[1] > time.monotonic():
+            return cached[2]
+        return self.refresh()
+
+    def default_path(self) -> Optional[str]:
+        """El libro de run-off más reciente: por periodo en el nombre y luego por fecha de modificación"""
+        workbooks = self.runoff_workbooks()
+        if not workbooks:
+            return None
+        newest = max(workbooks, key=lambda info: (info.period or "", info.modified))
+        return newest.path
+
+    def default_name(self) -> Optional[str]:
+        path = self.default_path()
+        return os.path.basename(path) if path else None
+
+    def resolve(self, text) -> Optional[str]:
+        """Libro de run-off al que se refiere el texto (nombre, parte del nombre o periodo)"""
+        if not text:
+            return None
+        workbooks = self.runoff_workbooks()
+        wanted = normalize_name(text)
+        for info in workbooks:
+            if normalize_name(info.name) == wanted or normalize_name(os.path.splitext(info.name)[0]) == wanted:
+                return info.path
+        period = _text_period(text)
+        if period is not None:
+            for info in workbooks:
+                if info.period == period:
+                    return info.path
+        matcher = ClientMatcher([os.path.splitext(info.name)[0] for info in workbooks])
+        best = matcher.find_best_client_match(text)
+        if best is None:
+            return None
+        return next(info.path for info in workbooks if os.path.splitext(info.name)[0] == best)
+
+    def labels(self) -> List[str]:
+        """Nombres de los libros de run-off para mostrarlos al modelo"""
+        return [os.path.splitext(info.name)[0] for info in self.runoff_workbooks()]
+
+
+dataset_registry = DatasetRegistry(
+    os.path.join(settings.MEDIA_ROOT, "xlsx"), getattr(settings, "DATASET_CATALOG_TTL", 30)
+)
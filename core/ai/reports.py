@@ -0,0 +1,226 @@
+import json
+import struct
+import zlib
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Filas por bloque comprimido del payload: una página toca uno o dos bloques
+CHUNK_ROWS = 500
+CHUNK_MAGIC = b"RPC1"
+# Marca, filas por bloque y cantidad de bloques; siguen los tamaños de cada bloque
+_HEADER = struct.Struct(">4sII")
+
+
+def _column_type(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "date"
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "number"
+    return "string"
+
+
+def _column_values(series: pd.Series, kind: str) -> list:
+    missing = series.isna().to_numpy()
+    if kind == "date":
+        values = np.datetime_as_string(series.to_numpy(dtype="datetime64[D]"), unit="D").astype(object)
+    elif kind == "string":
+        values = series.astype(str).to_numpy(dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+    values[missing] = None
+    return values.tolist()
+
+
+def encode_report(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Dict:
+    """
+    Serializa el resultado de un reporte como JSON por columnas, en bloques
+    de chunk_rows filas comprimidos con zlib por separado: una página solo
+    descomprime los bloques que cubre. Devuelve los campos de ReportArtifact
+    (columns, row_count, payload).
+    """
+    columns: List[Dict] = []
+    data = {}
+    for name in df.columns:
+        kind = _column_type(df[name])
+        columns.append({"name": str(name), "type": kind})
+        data[str(name)] = _column_values(df[name], kind)
+    chunks = []
+    for start in range(0, len(df), chunk_rows):
+        block = {name: values[start:start + chunk_rows] for name, values in data.items()}
+        raw = json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        chunks.append(zlib.compress(raw, 6))
+    header = _HEADER.pack(CHUNK_MAGIC, chunk_rows, len(chunks)) + struct.pack(f">{len(chunks)}I", *map(len, chunks))
+    return {"columns": columns, "row_count": len(df), "payload": header + b"".join(chunks)}
+
+
+def _decode_rows(view: memoryview, offset: int, stop: Optional[int]) -> Dict[str, list]:
+    """Valores por columna de las filas [offset, stop), leyendo solo los bloques necesarios"""
+    _, chunk_rows, count = _HEADER.unpack_from(view)
+    sizes = struct.unpack_from(f">{count}I", view, _HEADER.size)
+    bounds = list(accumulate(sizes, initial=0))
+    base = _HEADER.size + 4 * count
+    first = offset // chunk_rows
+    last = count if stop is None else min(count, -(-stop // chunk_rows))
+    data: Dict[str, list] = {}
+    for index in range(first, last):
+        block = json.loads(zlib.decompress(view[base + bounds[index]:base + bounds[index + 1]]).decode("utf-8"))
+        for name, values in block.items():
+            data.setdefault(name, []).extend(values)
+    skip = offset - first * chunk_rows
+    return {name: values[skip:None if stop is None else stop - first * chunk_rows] for name, values in data.items()}
+
+
+def decode_report(columns: List[Dict], payload: bytes, offset: int = 0, limit: int = None) -> pd.DataFrame:
+    """Reconstruye (una página de) el DataFrame guardado en un artefacto"""
+    view = memoryview(payload)
+    stop = None if limit is None else offset + limit
+    if view[:len(CHUNK_MAGIC)] == CHUNK_MAGIC:
+        data = _decode_rows(view, offset, stop)
+    else:
+        # Artefactos guardados antes de los bloques: un solo zlib con todo el reporte
+        data = {name: values[offset:stop] for name, values in json.loads(zlib.decompress(view).decode("utf-8")).items()}
+    frame = {}
+    for column in columns:
+        values = data.get(column["name"], [])
+        if column["type"] == "date":
+            frame[column["name"]] = pd.to_datetime(pd.Series(values, dtype=object))
+        elif column["type"] == "number":
+            frame[column["name"]] = pd.to_numeric(pd.Series(values, dtype=object))
+        else:
+            frame[column["name"]] = pd.Series(values, dtype=object)
+    return pd.DataFrame(frame)
+
+
+def _format_decimals(values: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """Formatea un arreglo de floats a texto con decimales fijos en una sola pasada"""
+    if not len(values):
+        return np.empty(0, dtype=object)
+    pattern = f"%.{decimals}f\0" * len(values)
+    return np.array((pattern % tuple(values.tolist())).split("\0")[:-1], dtype=object)
+
+
+def _format_dates(series: pd.Series, separator: str = " ") -> np.ndarray:
+    values = series.to_numpy(dtype="datetime64[s]")
+    valid = values[~np.isnat(values)]
+    # Igual que to_html: solo fecha si ningún valor tiene hora
+    if (valid.astype(np.int64) % 86400 == 0).all():
+        return np.datetime_as_string(values.astype("datetime64[D]"), unit="D").astype(object)
+    text = np.datetime_as_string(values, unit="s")
+    if separator != "T":
+        text = np.char.replace(text, "T", separator)
+    return text.astype(object)
+
+
+def _format_strings(series: pd.Series) -> np.ndarray:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Se formatean solo las categorías y se expanden por código
+        categories = np.append(series.cat.categories.astype(str).to_numpy(dtype=object), None)
+        return categories[series.cat.codes.to_numpy()]
+    return series.to_numpy(dtype=object)
+
+
+def _format_column(series: pd.Series, decimals: int = 2, date_separator: str = " "):
+    """
+    Devuelve (tipo, valores como texto, máscara de faltantes) para una
+    columna, sin pasar celda por celda por Python.
+    """
+    kind = _column_type(series)
+    missing = series.isna().to_numpy()
+    if kind == "date":
+        values = _format_dates(series, date_separator)
+    elif kind == "number" and pd.api.types.is_float_dtype(series):
+        kind = "decimal"
+        values = _format_decimals(series.to_numpy(dtype=float), decimals)
+    elif kind == "string":
+        values = _format_strings(series)
+    else:
+        values = series.astype(str).to_numpy(dtype=object)
+    return kind, values, missing
+
+
+def _html_missing(kind: str, series: pd.Series, missing: np.ndarray):
+    # Mismos marcadores de faltantes que to_html
+    if kind == "date":
+        return "NaT"
+    if kind != "string" or isinstance(series.dtype, pd.CategoricalDtype):
+        return "NaN"
+    original = series.to_numpy(dtype=object)[missing]
+    return np.where(pd.isna(original) & (original != None), "NaN", "None")  # noqa: E711
+
+
+def format_as_html_table(df: pd.DataFrame) -> str:
+    """Formatea DataFrame como tabla HTML (mismo marcado que DataFrame.to_html)"""
+    if df.empty:
+        return "<p>No se encontraron datos para mostrar.</p>"
+
+    header = "".join(f"      <th>{name}</th>\n" for name in df.columns)
+    rows = None
+    for name in df.columns:
+        kind, values, missing = _format_column(df[name])
+        if missing.any():
+            values = values.copy()
+            values[missing] = _html_missing(kind, df[name], missing)
+        cells = "      <td>" + values.astype(str).astype(object) + "</td>\n"
+        rows = cells if rows is None else rows + cells
+    return (
+        '<table border="1" class="dataframe table table-striped table-bordered">\n'
+        '  <thead>\n    <tr style="text-align: right;">\n'
+        f"{header}"
+        "    </tr>\n  </thead>\n  <tbody>\n"
+        + "".join("    <tr>\n" + rows + "    </tr>\n")
+        + "  </tbody>\n</table>"
+    )
+
+
+def format_as_json(df: pd.DataFrame) -> str:
+    """
+    Serializa el DataFrame como JSON por columnas: fechas ISO y columnas
+    de Capital con decimales fijos. Devuelve el texto JSON ya armado.
+    """
+    columns = []
+    data = []
+    for name in df.columns:
+        kind, values, missing = _format_column(df[name], date_separator="T")
+        columns.append({"name": str(name), "type": kind})
+        if kind == "decimal":
+            # Los decimales van como números JSON literales (p. ej. 1250.50)
+            values = values.copy()
+            values[missing] = "null"
+            encoded = "[" + ",".join(values.tolist()) + "]"
+        else:
+            if kind in ("number", "bool"):
+                values = df[name].to_numpy(dtype=object)
+            if missing.any():
+                values = values.copy()
+                values[missing] = None
+            encoded = json.dumps(values.tolist(), ensure_ascii=False, default=str)
+        data.append(f"{json.dumps(str(name), ensure_ascii=False)}:{encoded}")
+    header = json.dumps(columns, ensure_ascii=False)
+    return f'{{"columns":{header},"row_count":{len(df)},"data":{{{",".join(data)}}}}}'
+
+
+def format_as_csv(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False, float_format="%.2f")
+
+
+REPORT_FORMATS = {
+    "html": format_as_html_table,
+    "json": format_as_json,
+    "csv": format_as_csv,
+}
+
+
+def render_report(df: pd.DataFrame, output_format: str = "html") -> str:
+    """Renderiza el reporte en el formato pedido (html, json o csv)"""
+    try:
+        renderer = REPORT_FORMATS[output_format]
+    except KeyError:
+        raise ValueError(f"Formato de reporte no soportado: {output_format}. Use {', '.join(REPORT_FORMATS)}")
+    return renderer(df)
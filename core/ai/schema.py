@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Ejemplos de valores inválidos que se muestran por columna
+ERROR_SAMPLES = 3
+
+
+class SchemaError(ValueError):
+    """Columnas que no cumplen el esquema declarado; errors es {columna: detalle}"""
+
+    def __init__(self, sheet: str, errors: Dict[str, str]):
+        self.sheet = sheet
+        self.errors = errors
+        details = "; ".join(f"{column}: {detail}" for column, detail in errors.items())
+        super().__init__(f"La hoja {sheet} no cumple el esquema ({details})")
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    name: str
+    # category, decimal o date
+    kind: str
+    required: bool = False
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    sheet: str
+    columns: Tuple[ColumnSpec, ...]
+
+    @property
+    def required(self) -> Tuple[str, ...]:
+        return tuple(spec.name for spec in self.columns if spec.required)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convierte las columnas declaradas a su tipo. Las que no están en el
+        esquema quedan como vienen del Excel. Reúne los errores de todas las
+        columnas antes de lanzar SchemaError.
+        """
+        errors: Dict[str, str] = {}
+        typed = {}
+        for spec in self.columns:
+            if spec.name not in df.columns:
+                if spec.required:
+                    errors[spec.name] = "columna faltante"
+                continue
+            try:
+                typed[spec.name] = _CONVERTERS[spec.kind](df[spec.name])
+            except _InvalidValues as e:
+                errors[spec.name] = str(e)
+        if errors:
+            raise SchemaError(self.sheet, errors)
+        return df.assign(**typed)
+
+
+class _InvalidValues(ValueError):
+    pass
+
+
+def _blank_to_na(series: pd.Series) -> pd.Series:
+    if series.dtype == object:
+        return series.mask(series.map(lambda value: isinstance(value, str) and not value.strip()))
+    return series
+
+
+def _check(original: pd.Series, converted: pd.Series, expected: str):
+    invalid = converted.isna() & original.notna()
+    if invalid.any():
+        samples = ", ".join(repr(value) for value in original[invalid].unique()[:ERROR_SAMPLES])
+        raise _InvalidValues(f"{int(invalid.sum())} valores no son {expected} (p. ej. {samples})")
+
+
+def _to_category(series: pd.Series) -> pd.Series:
+    series = _blank_to_na(series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    values = series.where(series.isna(), series.astype(str).str.strip())
+    return values.astype(pd.CategoricalDtype(sorted(values.dropna().unique())))
+
+
+def _to_decimal(series: pd.Series) -> pd.Series:
+    series = _blank_to_na(series)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(np.float64)
+    converted = pd.to_numeric(series, errors="coerce")
+    _check(series, converted, "numéricos")
+    return converted.astype(np.float64)
+
+
+def _to_date(series: pd.Series) -> pd.Series:
+    series = _blank_to_na(series)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        converted = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        return converted.astype("datetime64[ns]")
+    # Columnas mezcladas: fechas de Excel, números de serie y textos dd/mm/aaaa
+    serials = pd.to_numeric(series, errors="coerce")
+    is_serial = serials.notna() & series.map(lambda value: not isinstance(value, str))
+    converted = pd.to_datetime(series.where(~is_serial), errors="coerce", dayfirst=True, format="mixed")
+    if is_serial.any():
+        converted[is_serial] = pd.to_datetime(serials[is_serial], unit="D", origin="1899-12-30")
+    _check(series, converted, "fechas")
+    return converted.astype("datetime64[ns]")
+
+
+_CONVERTERS = {"category": _to_category, "decimal": _to_decimal, "date": _to_date}
+
+
+RUNOFF_SCHEMA = SheetSchema("DETALLE", (
+    ColumnSpec("Empresa", "category", required=True),
+    ColumnSpec("Producto", "category", required=True),
+    ColumnSpec("Capital", "decimal", required=True),
+    ColumnSpec("Capital L/P", "decimal"),
+    ColumnSpec("Capital Divisa", "decimal"),
+    ColumnSpec("Moneda", "category"),
+    ColumnSpec("Fecha Venc.Cuota", "date"),
+    ColumnSpec("Fecha Vencimiento", "date"),
+    ColumnSpec("weekmonth", "category"),
+))
+
+# Esquema declarado por nombre de hoja
+SCHEMAS = {RUNOFF_SCHEMA.sheet: RUNOFF_SCHEMA}
+
+
+def schema_for(sheet_name: str) -> Optional[SheetSchema]:
+    return SCHEMAS.get(sheet_name)
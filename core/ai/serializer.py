@@ -1,10 +1,17 @@
-from rest_framework.serializers import ModelSerializer
-from .models import Chat,Message
+from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from .models import Chat,Message,ReportArtifact
 class ChatSerializer(ModelSerializer):
     class Meta:
         model = Chat
-        fields = '__all__'
+        exclude = ["context"]
 class MessageSerializer(ModelSerializer):
+    report = SerializerMethodField()
     class Meta:
         model = Message
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+    def get_report(self, obj):
+        # Requiere select_related("report") para no consultar por mensaje
+        try:
+            return obj.report.toJSON()
+        except ReportArtifact.DoesNotExist:
+            return None
\ No newline at end of file
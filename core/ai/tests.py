@@ -1,3 +1,714 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import zlib
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.authentication.tokens import token_versions, tokens_for_user
+from core.utils.ModelsApi import FakeBackend, Model
+
+from .aggregations import (
+    COUNT_COLUMN, GROUPINGS, MISSING_LABEL, VALUE_COLUMNS, AggregationEngine, normalize_grouping,
+)
+from .dataset import ExcelSnapshot, dataset_watcher
+from .dates import parse_date
+from .indexes import DateIndex
+from .intents import IntentRules, intent_metrics
+from .models import Chat, Message, ReportArtifact
+from .registry import dataset_registry
+from .reports import CHUNK_MAGIC, PAGE_SIZE, decode_report, encode_report, format_as_html_table, render_report
+from .schema import RUNOFF_SCHEMA, SchemaError
+from .views import ReportingService
 
 # Create your tests here.
+CLIENTS = ["Minera del Sur S.A.", "Agroexport Perú SAC", "Textil Lima S.R.L."]
+PRODUCTS = ["LEASING", "COMERCIAL", "FIANZAS"]
+# La caché compartida de settings escribe en cache/shared del repositorio
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-shared"},
+}
+
+
+def build_runoff(rows: int = 150, seed: int = 0) -> pd.DataFrame:
+    """Hoja DETALLE sintética; algunas cuotas sin fecha para probar los NaT"""
+    rng = np.random.default_rng(seed)
+    cuotas = pd.Timestamp("2025-05-01") + pd.to_timedelta(rng.integers(0, 300, rows), unit="D")
+    cuotas = pd.Series(cuotas).mask(rng.random(rows) < 0.05)
+    return pd.DataFrame({
+        "Empresa": rng.choice(CLIENTS, rows),
+        "Fecha Venc.Cuota": cuotas,
+        "Producto": rng.choice(PRODUCTS, rows),
+        "Capital": np.round(rng.random(rows) * 100000, 2),
+        "Capital L/P": np.round(rng.random(rows) * 50000, 2),
+        "Capital Divisa": np.round(rng.random(rows) * 1000, 2),
+        "Moneda": rng.choice(["PEN", "USD"], rows),
+        "Fecha Vencimiento": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 600, rows), unit="D"),
+        "weekmonth": rng.choice(["S1", "S2", "S3", "S4"], rows),
+    })
+
+
+class RunOffTestCase(TestCase):
+    """
+    Libro de run-off temporal como único dataset del catálogo, snapshots en
+    un directorio temporal, cachés en memoria, sin watcher ni caché de LLM y
+    con un usuario autenticado por cookie.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.tmp, ignore_errors=True)
+        (cls.tmp / "xlsx").mkdir()
+        cls.frame = build_runoff()
+        cls.workbook = cls.tmp / "xlsx" / "Run Off BEC 202505_prueba.xlsx"
+        cls.frame.to_excel(cls.workbook, sheet_name="DETALLE", index=False)
+
+    def setUp(self):
+        settings = override_settings(DATASET_SNAPSHOT_ROOT=str(self.tmp / "snapshots"), CACHES=TEST_CACHES)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for patcher in (
+            mock.patch.object(dataset_registry, "directory", str(self.tmp / "xlsx")),
+            mock.patch.object(dataset_watcher, "interval", 0),
+            mock.patch("core.utils.ModelsApi.LLM_CACHE_ENABLED", False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("analista", password="clave")
+        token_versions.forget(self.user.pk)
+        self.client.cookies["access_token"] = str(tokens_for_user(self.user).access_token)
+
+    def use_llm(self, **kwargs) -> FakeBackend:
+        backend = FakeBackend(**kwargs)
+        Model.use_backend("gemini", backend)
+        self.addCleanup(Model.use_backend, "gemini", None)
+        return backend
+
+
+class ChatCreateTests(RunOffTestCase):
+    url = "/api/ai/chat/create/"
+
+    def post(self, text, chat_id=None):
+        payload = {"message_text": text}
+        if chat_id:
+            payload["chat_id"] = chat_id
+        response = self.client.post(self.url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertTrue(body["success"], body)
+        return body["data"]
+
+    def test_greeting_is_answered_without_the_model(self):
+        llm = self.use_llm(default="no debería llamarse")
+        data = self.post("hola")
+        self.assertEqual(llm.calls, [])
+        self.assertIsNone(data["report"])
+        self.assertIn("Hola", data["message_text"])
+
+    def test_report_for_a_named_client(self):
+        llm = self.use_llm(responses={"resumen ejecutivo": "Resumen de prueba"})
+        data = self.post("reporte de Minera del Sur S.A.")
+        expected = int((self.frame["Empresa"] == "Minera del Sur S.A.").sum())
+        self.assertEqual(data["report"]["row_count"], expected)
+        self.assertIn("Resumen de prueba", data["message_text"])
+        # La intención se resolvió localmente: la única llamada es el resumen
+        self.assertEqual(len(llm.calls), 1)
+        artifact = ReportArtifact.objects.get(pk=data["report"]["id"])
+        self.assertEqual(len(artifact.get_page(0, None)), expected)
+
+    def test_ambiguous_message_uses_the_model_intent(self):
+        intent = {
+            "intent_type": "report_request",
+            "confidence": 0.9,
+            "entities": {"client_name": "minera del sur", "date_from": "junio 2025", "date_field": "cuota"},
+            "response_text": None,
+        }
+        llm = self.use_llm(responses={"MENSAJE DEL USUARIO": json.dumps(intent), "resumen ejecutivo": "Resumen"})
+        data = self.post("cronograma de minera desde junio")
+        frame = self.frame
+        expected = int(((frame["Empresa"] == "Minera del Sur S.A.") & (frame["Fecha Venc.Cuota"] >= "2025-06-01")).sum())
+        self.assertEqual(data["report"]["row_count"], expected)
+        self.assertTrue(any("MENSAJE DEL USUARIO" in call["prompt"] for call in llm.calls))
+
+    def test_model_failure_falls_back_to_keywords(self):
+        def fail(prompt, modelname, temperature):
+            raise RuntimeError("sin red")
+        llm = self.use_llm(handler=fail)
+        before = intent_metrics.stats()["counts"]["fallback"]
+        data = self.post("quiero ver datos de algo")
+        self.assertEqual(len(llm.calls), 1)
+        self.assertEqual(intent_metrics.stats()["counts"]["fallback"], before + 1)
+        self.assertIsNone(data["report"])
+        self.assertEqual(Message.objects.get(pk=data["id"]).sender, "ai")
+
+    def test_follow_up_reuses_the_chat(self):
+        self.use_llm(default="Resumen")
+        first = self.post("reporte de Textil Lima S.R.L.")
+        second = self.post("gracias", chat_id=first["chat"])
+        self.assertEqual(second["chat"], first["chat"])
+        self.assertEqual(Chat.objects.get(pk=first["chat"]).context[0]["sender"], "user")
+
+
+class DatasetRegistryTests(RunOffTestCase):
+    def test_requests_reuse_the_runoff_list(self):
+        dataset_registry.refresh()
+        with mock.patch.object(dataset_registry, "catalog", wraps=dataset_registry.catalog) as catalog:
+            for _ in range(3):
+                service = ReportingService()
+                dataset_registry.labels()
+            self.assertEqual(catalog.call_count, 0)
+            self.assertEqual(service.excel_file_path, str(self.workbook))
+            dataset_watcher.poll()
+            self.assertEqual(catalog.call_count, 1)
+
+    def test_watcher_skips_other_workbooks(self):
+        ReportingService().get_version()
+        other = self.tmp / "xlsx" / "Tipo de cambio.xlsx"
+        self.addCleanup(other.unlink)
+        pd.DataFrame({"Moneda": ["USD"], "Tasa": [3.7]}).to_excel(other, sheet_name="TC", index=False)
+        with mock.patch("core.ai.dataset.ExcelSnapshot", wraps=ExcelSnapshot) as snapshot:
+            dataset_watcher.poll()
+        self.assertNotIn(str(other), [call.args[0] for call in snapshot.call_args_list])
+
+    def test_watcher_publishes_a_newer_workbook(self):
+        dataset_registry.refresh()
+        newer = self.tmp / "xlsx" / "Run Off BEC 202506_prueba.xlsx"
+        # Al terminar se borra el libro y se vuelve a publicar la lista
+        self.addCleanup(dataset_registry.refresh)
+        self.addCleanup(newer.unlink)
+        self.frame.head(10).to_excel(newer, sheet_name="DETALLE", index=False)
+        self.assertEqual(dataset_registry.default_path(), str(self.workbook))
+        dataset_watcher.poll()
+        self.assertEqual(dataset_registry.default_path(), str(newer))
+
+
+class ReportPayloadTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = build_runoff(rows=23).drop(columns=["Moneda"])
+        self.report = encode_report(self.frame, chunk_rows=5)
+
+    def decode(self, offset=0, limit=None):
+        return decode_report(self.report["columns"], self.report["payload"], offset, limit)
+
+    def assertPage(self, page, offset, stop):
+        expected = self.frame.iloc[offset:stop].reset_index(drop=True)
+        self.assertEqual(page["Empresa"].tolist(), expected["Empresa"].tolist())
+        self.assertEqual(page["Capital"].tolist(), expected["Capital"].tolist())
+        pd.testing.assert_series_equal(page["Fecha Venc.Cuota"], expected["Fecha Venc.Cuota"], check_dtype=False)
+
+    def test_pages_across_chunk_bounds(self):
+        self.assertEqual(self.report["row_count"], 23)
+        for offset, limit in ((0, None), (0, 5), (3, 4), (4, 7), (10, 5), (20, 100), (23, 10), (40, 5)):
+            with self.subTest(offset=offset, limit=limit):
+                self.assertPage(self.decode(offset, limit), offset, None if limit is None else offset + limit)
+
+    def test_page_only_decompresses_its_chunks(self):
+        with mock.patch("core.ai.reports.zlib.decompress", wraps=zlib.decompress) as decompress:
+            self.decode(7, 5)
+        self.assertEqual(decompress.call_count, 2)
+
+    def test_reads_single_block_payloads(self):
+        # Un solo bloque sin encabezado es el formato anterior a los bloques
+        whole = encode_report(self.frame, chunk_rows=len(self.frame))["payload"]
+        legacy = whole[len(CHUNK_MAGIC) + 12:]
+        self.assertPage(decode_report(self.report["columns"], legacy, 4, 7), 4, 11)
+
+
+class ReportArtifactViewTests(RunOffTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chat = Chat.objects.create(user=self.user, title="Reportes")
+
+    def create_artifact(self, frame, pk=None):
+        message = Message.objects.create(chat=self.chat, sender="ai", message_text="reporte")
+        return ReportArtifact.objects.create(pk=pk, message=message, client_name="Minera del Sur S.A.", **encode_report(frame))
+
+    def get(self, artifact, **params):
+        response = self.client.get(f"/api/ai/chat/report/{artifact.pk}/", {"format": "json", **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def test_reused_id_is_not_served_from_the_cache(self):
+        frame = build_runoff(rows=30)
+        first = self.create_artifact(frame.head(10))
+        self.assertEqual(self.get(first)["table"]["row_count"], 10)
+        pk = first.pk
+        first.message.delete()
+        second = self.create_artifact(frame.tail(4), pk=pk)
+        self.assertEqual(second.pk, pk)
+        self.assertEqual(self.get(second)["table"]["row_count"], 4)
+
+    def test_cache_stays_out_of_the_repository(self):
+        from django.core.cache import caches
+        self.assertEqual(caches["shared"].__class__.__name__, "LocMemCache")
+
+
+class AggregationEngineTests(SimpleTestCase):
+    def setUp(self):
+        frame = build_runoff(rows=200, seed=3)
+        rng = np.random.default_rng(3)
+        frame.loc[rng.random(len(frame)) < 0.1, "Capital"] = np.nan
+        frame.loc[rng.random(len(frame)) < 0.05, "Moneda"] = None
+        self.frame = frame.assign(**{column: frame[column].astype("category") for column in ("Producto", "weekmonth", "Moneda")})
+        self.engine = AggregationEngine(self.frame)
+
+    def expected(self, grouping, rows):
+        column, label = GROUPINGS[grouping]
+        frame = self.frame.iloc[rows]
+        keys = frame[column].dt.strftime("%Y-%m") if grouping == "month" else frame[column].astype(object)
+        grouped = frame.assign(_key=keys.fillna(MISSING_LABEL)).groupby("_key", sort=True)
+        result = grouped[list(VALUE_COLUMNS)].sum().round(2)
+        result.insert(0, COUNT_COLUMN, grouped.size())
+        order = sorted(result.index, key=lambda key: (key == MISSING_LABEL, key))
+        return result.loc[order].rename_axis(label).reset_index()
+
+    def test_matches_pandas_groupby(self):
+        positions = np.flatnonzero((self.frame["Empresa"] == CLIENTS[0]).to_numpy())
+        for grouping in GROUPINGS:
+            for rows in (slice(None), slice(20, 120), positions):
+                with self.subTest(grouping=grouping, rows=rows if isinstance(rows, slice) else "positions"):
+                    result = self.engine.aggregate(grouping, rows)
+                    pd.testing.assert_frame_equal(result, self.expected(grouping, rows), check_dtype=False)
+
+    def test_results_are_cached_by_key(self):
+        first = self.engine.aggregate("product", slice(0, 50), key=("a",))
+        self.assertIs(self.engine.aggregate("product", slice(0, 50), key=("a",)), first)
+        self.assertIsNot(self.engine.aggregate("product", slice(0, 50)), first)
+
+    def test_unknown_grouping(self):
+        with self.assertRaisesMessage(ValueError, "Agrupación no soportada"):
+            self.engine.aggregate("cliente")
+        self.assertEqual(normalize_grouping("Meses"), "month")
+
+
+class ReportRenderTests(SimpleTestCase):
+    def setUp(self):
+        frame = build_runoff(rows=12, seed=5)
+        frame.loc[[2, 7], "Capital"] = np.nan
+        frame.loc[4, "Producto"] = None
+        frame["Empresa"] = frame["Empresa"].astype("category")
+        frame["Cuotas"] = np.arange(len(frame))
+        self.frame = frame
+
+    def test_html_matches_to_html(self):
+        expected = self.frame.to_html(
+            index=False, classes="table table-striped table-bordered", escape=False, float_format="{:.2f}".format
+        )
+        self.assertEqual(format_as_html_table(self.frame), expected)
+
+    def test_html_keeps_times_when_present(self):
+        frame = self.frame.head(3).assign(**{"Fecha Vencimiento": pd.to_datetime(["2025-05-01 10:30", None, "2025-05-02 00:00"])})
+        expected = frame.to_html(
+            index=False, classes="table table-striped table-bordered", escape=False, float_format="{:.2f}".format
+        )
+        self.assertEqual(format_as_html_table(frame), expected)
+        self.assertIn("<p>", format_as_html_table(frame.iloc[0:0]))
+
+    def test_json_is_columnar(self):
+        payload = json.loads(render_report(self.frame, "json"))
+        types = {column["name"]: column["type"] for column in payload["columns"]}
+        self.assertEqual(payload["row_count"], 12)
+        self.assertEqual((types["Capital"], types["Fecha Venc.Cuota"], types["Cuotas"], types["Producto"]),
+                         ("decimal", "date", "number", "string"))
+        data = payload["data"]
+        self.assertEqual(data["Capital"][2], None)
+        self.assertEqual(data["Capital"][0], round(self.frame["Capital"].iloc[0], 2))
+        self.assertEqual(data["Fecha Venc.Cuota"][0], self.frame["Fecha Venc.Cuota"].iloc[0].strftime("%Y-%m-%d"))
+        self.assertEqual(data["Producto"][4], None)
+        self.assertEqual(data["Cuotas"], list(range(12)))
+        self.assertEqual(data["Empresa"], self.frame["Empresa"].astype(str).tolist())
+
+    def test_csv_uses_two_decimals(self):
+        text = render_report(self.frame, "csv")
+        self.assertEqual(text, self.frame.to_csv(index=False, float_format="%.2f"))
+        self.assertEqual(pd.read_csv(io.StringIO(text))["Capital"].isna().sum(), 2)
+
+    def test_unknown_format(self):
+        with self.assertRaisesMessage(ValueError, "Formato de reporte no soportado"):
+            render_report(self.frame, "xml")
+
+
+class SheetSchemaTests(SimpleTestCase):
+    def test_converts_declared_types(self):
+        frame = pd.DataFrame({
+            "Empresa": [" Minera del Sur S.A. ", "Textil Lima S.R.L.", ""],
+            "Producto": ["LEASING", "FIANZAS", "LEASING"],
+            "Capital": ["1250.5", 300, "  "],
+            "Fecha Venc.Cuota": ["15/05/2025", 45809, None],
+            "Extra": ["a", "b", "c"],
+        })
+        typed = RUNOFF_SCHEMA.apply(frame)
+        self.assertIsInstance(typed["Empresa"].dtype, pd.CategoricalDtype)
+        self.assertEqual(typed["Empresa"].tolist()[:2], ["Minera del Sur S.A.", "Textil Lima S.R.L."])
+        self.assertTrue(pd.isna(typed["Empresa"].iloc[2]))
+        self.assertEqual(typed["Capital"].dtype, np.float64)
+        self.assertEqual(typed["Capital"].tolist()[:2], [1250.5, 300.0])
+        self.assertTrue(np.isnan(typed["Capital"].iloc[2]))
+        # Texto dd/mm/aaaa y número de serie de Excel (45809 = 2025-06-01)
+        self.assertEqual(typed["Fecha Venc.Cuota"].tolist()[:2], [pd.Timestamp("2025-05-15"), pd.Timestamp("2025-06-01")])
+        self.assertEqual(typed["Extra"].tolist(), ["a", "b", "c"])
+
+    def test_collects_every_invalid_column(self):
+        frame = pd.DataFrame({
+            "Empresa": ["A", "B"],
+            "Capital": ["100", "mucho"],
+            "Fecha Vencimiento": ["2025-05-01", "pronto"],
+        })
+        with self.assertRaises(SchemaError) as raised:
+            RUNOFF_SCHEMA.apply(frame)
+        errors = raised.exception.errors
+        self.assertEqual(set(errors), {"Producto", "Capital", "Fecha Vencimiento"})
+        self.assertEqual(errors["Producto"], "columna faltante")
+        self.assertIn("'mucho'", errors["Capital"])
+        self.assertIn("'pronto'", errors["Fecha Vencimiento"])
+        self.assertIn("DETALLE", str(raised.exception))
+
+
+class InvalidWorkbookTests(RunOffTestCase):
+    def test_invalid_workbook_is_rejected_on_load(self):
+        path = self.tmp / "xlsx" / "Run Off BEC 202404_invalido.xlsx"
+        self.addCleanup(path.unlink)
+        self.frame.head(5).assign(Capital=["1", "2", "tres", "4", "5"]).to_excel(path, sheet_name="DETALLE", index=False)
+        with self.assertRaisesMessage(ValueError, "Capital: 1 valores no son numéricos"):
+            ReportingService(str(path)).get_version()
+        # Queda a lo sumo el archivo de lock: ningún snapshot con datos sin validar
+        self.assertFalse([path for path in (self.tmp / "snapshots").glob("*invalido*") if path.is_dir()])
+
+    def test_workbook_without_required_columns_is_not_runoff(self):
+        path = self.tmp / "xlsx" / "Run Off BEC 202403_sin_capital.xlsx"
+        self.addCleanup(dataset_registry.refresh)
+        self.addCleanup(path.unlink)
+        self.frame.drop(columns=["Capital"]).to_excel(path, sheet_name="DETALLE", index=False)
+        self.assertNotIn(path.name, [info.name for info in dataset_registry.refresh()])
+
+
+class AsyncChatTestCase(RunOffTestCase):
+    url = "/api/ai/chat/create/async/"
+
+    def setUp(self):
+        super().setUp()
+        self.async_client.cookies["access_token"] = self.client.cookies["access_token"].value
+
+    async def post(self, url, **payload):
+        return await self.async_client.post(url, payload, content_type="application/json")
+
+
+class AsyncChatTests(AsyncChatTestCase):
+    async def test_async_report(self):
+        llm = self.use_llm(responses={"resumen ejecutivo": "Resumen async"})
+        response = await self.post(self.url, message_text="reporte de Minera del Sur S.A.")
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()["data"]
+        self.assertEqual(data["report"]["row_count"], int((self.frame["Empresa"] == "Minera del Sur S.A.").sum()))
+        self.assertIn("Resumen async", data["message_text"])
+        self.assertEqual(len(llm.calls), 1)
+
+    async def test_async_summary_deadline_uses_the_default_text(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+
+        def slow(prompt, modelname, temperature):
+            gate.wait(5)
+            return "tarde"
+
+        self.use_llm(handler=slow)
+        with override_settings(REPORT_SUMMARY_TIMEOUT=0.2):
+            response = await self.post(self.url, message_text="reporte de Textil Lima S.R.L.")
+        data = response.json()["data"]
+        expected = int((self.frame["Empresa"] == "Textil Lima S.R.L.").sum())
+        self.assertIn(f"Reporte generado para Textil Lima S.R.L. con {expected} registros", data["message_text"])
+        self.assertNotIn("tarde", data["message_text"])
+
+    async def test_async_requires_authentication(self):
+        self.async_client.cookies.clear()
+        response = await self.post(self.url, message_text="hola")
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(response.json()["success"])
+
+
+class ChatStreamTests(AsyncChatTestCase):
+    stream_url = "/api/ai/chat/create/stream/"
+
+    async def stream(self, **payload):
+        response = await self.post(self.stream_url, **payload)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8")
+        events = []
+        for block in body.strip().split("\n\n"):
+            name, data = block.split("\n", 1)
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    async def test_stream_event_sequence(self):
+        self.use_llm(responses={"resumen ejecutivo": "Resumen en vivo"})
+        events = await self.stream(message_text="reporte de Minera del Sur S.A.", format="json")
+        names = [name for name, _ in events]
+        self.assertEqual(names[:2], ["start", "intent"])
+        self.assertEqual(names[-1], "done")
+        self.assertEqual(sorted(names[2:-1]), ["table", "token"])
+        data = dict(events)
+        expected = int((self.frame["Empresa"] == "Minera del Sur S.A.").sum())
+        self.assertEqual(data["intent"]["entities"], {"client_name": "Minera del Sur S.A."})
+        self.assertEqual(data["token"], {"text": "Resumen en vivo"})
+        self.assertEqual(data["table"]["total_records"], expected)
+        self.assertEqual(data["table"]["table"]["row_count"], min(expected, PAGE_SIZE))
+        self.assertTrue(data["done"]["success"])
+        self.assertEqual(data["done"]["data"]["chat"], data["start"]["chat_id"])
+        self.assertEqual(data["done"]["data"]["report"]["row_count"], expected)
+
+    async def test_stream_summary_failure_falls_back(self):
+        def fail(prompt, modelname, temperature):
+            raise RuntimeError("sin red")
+
+        self.use_llm(handler=fail)
+        events = await self.stream(message_text="reporte de Textil Lima S.R.L.")
+        tokens = [data["text"] for name, data in events if name == "token"]
+        self.assertEqual(len(tokens), 1)
+        self.assertTrue(tokens[0].startswith("Reporte generado para Textil Lima S.R.L."))
+        self.assertTrue(events[-1][1]["success"])
+
+    async def test_stream_error_event(self):
+        intent = {"intent_type": "report_request", "confidence": 0.9, "entities": {}, "response_text": None}
+        self.use_llm(responses={"MENSAJE DEL USUARIO": json.dumps(intent)})
+        events = await self.stream(message_text="quiero un reporte")
+        names = [name for name, _ in events]
+        self.assertEqual(names, ["start", "intent", "error", "done"])
+        self.assertEqual(events[2][1]["error"], "No se pudo identificar el cliente para el reporte")
+        self.assertIsNone(events[3][1]["data"]["report"])
+
+    async def test_stream_rejects_unknown_format(self):
+        response = await self.post(self.stream_url, message_text="hola", format="xml")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Formato de reporte no soportado", response.json()["error"])
+
+
+class IntentRulesTests(SimpleTestCase):
+    def setUp(self):
+        self.rules = IntentRules(CLIENTS, PRODUCTS)
+
+    def test_resolves_evident_requests(self):
+        intent = self.rules.classify("reporte de Minera del Sur S.A. leasing por producto")
+        self.assertEqual(intent["intent_type"], "report_request")
+        self.assertEqual(intent["entities"], {"client_name": "Minera del Sur S.A.", "product": "LEASING", "group_by": "product"})
+        self.assertEqual(self.rules.classify("Buenas tardes")["intent_type"], "conversation")
+
+    def test_negations_go_to_the_model(self):
+        for message in (
+            "reporte de Minera del Sur S.A. sin LEASING",
+            "reporte de Minera del Sur S.A. excepto fianzas",
+            "reporte de Textil Lima S.R.L. salvo comercial",
+            "reporte de Textil Lima S.R.L. menos leasing",
+            "no quiero el reporte de Minera del Sur S.A.",
+            "reporte de Agroexport Perú SAC, ni leasing ni fianzas",
+        ):
+            with self.subTest(message=message):
+                self.assertIsNone(self.rules.classify(message))
+
+
+class ParseDateTests(SimpleTestCase):
+    today = pd.Timestamp("2025-05-20")
+
+    def assertParses(self, text, expected, end=False):
+        self.assertEqual(parse_date(text, end=end, today=self.today), pd.Timestamp(expected), text)
+
+    def test_numeric_formats(self):
+        self.assertParses("2025-05-15", "2025-05-15")
+        self.assertParses("2025-05-15T10:30:00", "2025-05-15")
+        self.assertParses("15/05/2025", "2025-05-15")
+        self.assertParses("15-05-25", "2025-05-15")
+        self.assertParses("05/2025", "2025-05-01")
+        self.assertParses("05/2025", "2025-05-31", end=True)
+        self.assertParses("2025-02", "2025-02-28", end=True)
+
+    def test_spanish_text(self):
+        self.assertParses("15 de mayo de 2025", "2025-05-15")
+        self.assertParses("1 de Setiembre del 2025", "2025-09-01")
+        self.assertParses("Mayo 2025", "2025-05-01")
+        self.assertParses("mayo, 2025", "2025-05-31", end=True)
+        self.assertParses("dic.", "2025-12-01")
+        self.assertParses("febrero de 2024", "2024-02-29", end=True)
+        self.assertParses("2025", "2025-01-01")
+        self.assertParses("año 2025", "2025-12-31", end=True)
+
+    def test_relative_days(self):
+        self.assertParses("hoy", "2025-05-20")
+        self.assertParses("Ayer", "2025-05-19")
+        self.assertParses("mañana", "2025-05-21")
+
+    def test_empty_and_invalid(self):
+        for value in (None, "", "null", "N/A"):
+            self.assertIsNone(parse_date(value))
+        for value in ("pronto", "31/02/2025", "2025-13"):
+            with self.assertRaisesMessage(ValueError, "Fecha no reconocida"):
+                parse_date(value, today=self.today)
+
+
+class DateIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            "Empresa": pd.Categorical(["A", "A", "A", "A", "B", "B"]),
+            "Fecha": pd.to_datetime(["2025-05-31 18:00", None, "2025-05-01 00:00", "2025-06-01 00:00", "2025-05-15 00:00", None]),
+        })
+
+    def test_end_day_is_inclusive(self):
+        index = DateIndex(self.frame, "Fecha")
+        positions = index.positions(0, 4, pd.Timestamp("2025-05-01"), pd.Timestamp("2025-05-31"))
+        self.assertEqual(positions.tolist(), [0, 2])
+
+    def test_nat_is_never_selected(self):
+        index = DateIndex(self.frame, "Fecha")
+        self.assertEqual(index.positions(0, 4).tolist(), [0, 2, 3])
+        self.assertEqual(index.positions(4, 6, date_to=pd.Timestamp("2025-12-31")).tolist(), [4])
+
+    def test_ungrouped_index(self):
+        index = DateIndex(self.frame, "Fecha", client_column=None)
+        positions = index.positions(0, 6, pd.Timestamp("2025-05-15"), pd.Timestamp("2025-05-31"))
+        self.assertEqual(positions.tolist(), [0, 4])
+
+
+class SelectRowsTests(RunOffTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = ReportingService()
+        self.version = self.service.get_version()
+
+    def assertSelects(self, client_name=None, product=None, date_from=None, date_to=None, date_field=None):
+        frame = self.version.frame
+        date_from, date_to = parse_date(date_from), parse_date(date_to, end=True)
+        mask = pd.Series(True, index=frame.index)
+        if client_name:
+            mask &= frame["Empresa"] == client_name
+        if product:
+            mask &= frame["Producto"] == product
+        if date_from is not None or date_to is not None:
+            dates = frame[self.service._date_column(date_field)]
+            mask &= dates.notna()
+            if date_from is not None:
+                mask &= dates >= date_from
+            if date_to is not None:
+                mask &= dates < date_to + pd.Timedelta(days=1)
+        rows = self.service._select_rows(self.version, client_name, product, date_from, date_to, date_field)
+        self.assertEqual(np.arange(len(frame))[rows].tolist(), np.flatnonzero(mask.to_numpy()).tolist())
+
+    def test_aggregations_read_the_snapshot_in_place(self):
+        values = self.version.aggregations._get_values("Capital")
+        self.assertFalse(values.flags.owndata)
+        self.assertFalse(values.flags.writeable)
+        result = self.service.get_aggregation("product", client_name="Minera del Sur S.A.")
+        rows = self.frame[self.frame["Empresa"] == "Minera del Sur S.A."]
+        self.assertAlmostEqual(result["Capital"].sum(), rows["Capital"].sum(), places=2)
+
+    def test_matches_a_pandas_mask(self):
+        cases = [
+            {},
+            {"client_name": "Minera del Sur S.A."},
+            {"product": "LEASING"},
+            {"client_name": "Agroexport Perú SAC", "product": "FIANZAS"},
+            {"date_from": "junio 2025"},
+            {"date_to": "2025-08-15"},
+            {"client_name": "Textil Lima S.R.L.", "date_from": "01/07/2025", "date_to": "septiembre 2025"},
+            {"client_name": "Minera del Sur S.A.", "product": "COMERCIAL", "date_from": "2025"},
+            {"date_from": "2026", "date_to": "2026", "date_field": "vencimiento"},
+            {"client_name": "Agroexport Perú SAC", "date_to": "marzo 2027", "date_field": "Fecha Vencimiento"},
+        ]
+        for case in cases:
+            with self.subTest(**case):
+                self.assertSelects(**case)
+
+
+class MessageListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("analista", password="clave")
+        token_versions.forget(self.user.pk)
+        self.client.cookies["access_token"] = str(tokens_for_user(self.user).access_token)
+        self.chat = Chat.objects.create(user=self.user, title="Historial")
+        self.messages = [
+            Message.objects.create(chat=self.chat, sender="user" if i % 2 == 0 else "ai", message_text=f"m{i}")
+            for i in range(7)
+        ]
+        # Mensajes guardados en el mismo instante: el id desempata
+        moment = timezone.now()
+        for offset, ids in enumerate(([0], [1, 2, 3], [4], [5, 6])):
+            Message.objects.filter(pk__in=[self.messages[i].pk for i in ids]).update(
+                created_at=moment + timedelta(seconds=offset)
+            )
+        self.ids = [message.pk for message in self.messages]
+
+    def page(self, chat_id=None, **params):
+        response = self.client.get(f"/api/ai/chat/message/list/{chat_id or self.chat.pk}/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        return [message["id"] for message in body["data"]], body["pagination"]
+
+    def test_latest_page_without_cursor(self):
+        ids, pagination = self.page(limit=3)
+        self.assertEqual(ids, self.ids[4:])
+        self.assertTrue(pagination["has_more"])
+        self.assertEqual((pagination["before"], pagination["after"]), (self.ids[4], self.ids[6]))
+
+    def test_walk_backwards_across_ties(self):
+        seen, cursor = [], None
+        while True:
+            ids, pagination = self.page(limit=2, **({"before": cursor} if cursor else {}))
+            seen = ids + seen
+            if not pagination["has_more"]:
+                break
+            cursor = pagination["before"]
+        self.assertEqual(seen, self.ids)
+
+    def test_walk_forwards_across_ties(self):
+        seen, cursor = [], self.ids[0]
+        while True:
+            ids, pagination = self.page(limit=2, after=cursor)
+            seen += ids
+            if not pagination["has_more"]:
+                break
+            cursor = pagination["after"]
+        self.assertEqual(seen, self.ids[1:])
+
+    def test_cursor_inside_a_tie(self):
+        self.assertEqual(self.page(after=self.ids[2])[0], self.ids[3:])
+        self.assertEqual(self.page(before=self.ids[2])[0], self.ids[:2])
+
+    def test_cursor_from_another_chat(self):
+        other = Chat.objects.create(user=self.user, title="Otro")
+        foreign = Message.objects.create(chat=other, sender="user", message_text="x")
+        for cursor in ("before", "after"):
+            ids, pagination = self.page(**{cursor: foreign.pk})
+            self.assertEqual(ids, [])
+            self.assertFalse(pagination["has_more"])
+
+    def test_chat_of_another_user(self):
+        intruder = User.objects.create_user("otro", password="clave")
+        token_versions.forget(intruder.pk)
+        self.client.cookies["access_token"] = str(tokens_for_user(intruder).access_token)
+        ids, pagination = self.page()
+        self.assertEqual(ids, [])
+        self.assertEqual((pagination["before"], pagination["after"]), (None, None))
+
+    def test_page_does_not_load_report_payloads(self):
+        ReportArtifact.objects.create(
+            message=self.messages[5], client_name="Minera del Sur S.A.", **encode_report(build_runoff(rows=20))
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/ai/chat/message/list/{self.chat.pk}/")
+        reports = {message["id"]: message["report"] for message in response.json()["data"]}
+        self.assertEqual(reports[self.ids[5]]["row_count"], 20)
+        self.assertIsNone(reports[self.ids[4]])
+        selects = [query["sql"] for query in queries if "messages" in query["sql"]]
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn("payload", selects[0])
@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import ChatMessageCreateView,ChatListView,MessageListView,MessageCreateView,ChatDestroyView
+from django.views.decorators.csrf import csrf_exempt
+from .views import ChatMessageCreateView,ChatMessageCreateAsyncView,ChatMessageStreamView,ChatListView,MessageListView,MessageCreateView,ChatDestroyView,ReportArtifactView,IntentMetricsView,DatasetCatalogView
 urlpatterns = [
     path(route="chat/create/",view=ChatMessageCreateView.as_view()),
+    path(route="chat/create/async/",view=csrf_exempt(ChatMessageCreateAsyncView.as_view())),
+    path(route="chat/create/stream/",view=csrf_exempt(ChatMessageStreamView.as_view())),
     path(route="chat/list/",view=ChatListView.as_view()),
     path(route="chat/delete/<int:pk>/",view=ChatDestroyView.as_view()),
     path(route="chat/message/list/<int:pk>/",view=MessageListView.as_view()),
     path(route="chat/message/create/",view=MessageCreateView.as_view()),
+    path(route="chat/report/<int:pk>/",view=ReportArtifactView.as_view()),
+    path(route="datasets/",view=DatasetCatalogView.as_view()),
+    path(route="metrics/",view=IntentMetricsView.as_view()),
 ]
@@ -3,20 +3,40 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
 from core.utils.ModelsApi import Model
-from difflib import SequenceMatcher
+from core.utils.TieredCache import get_cache, tiered_cache_stats
 from django.conf import settings
+import asyncio
 import json
-from django.core.cache import cache
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from .models import Chat, Message
-from rest_framework.permissions import IsAuthenticated
+from .aggregations import GROUPINGS, normalize_grouping
+from .dataset import DatasetMetadata, dataset_store, dataset_watcher
+from .context import ConversationContext
+from .dates import parse_date
+from .indexes import DateIndex
+from .intents import IntentRules, intent_metrics
+from .matching import ClientMatcher
+from .registry import dataset_registry
+from .models import Chat, Message, ReportArtifact
+from .reports import MAX_PAGE_SIZE, PAGE_SIZE, REPORT_FORMATS, encode_report, render_report
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.db.models import Q, Subquery
 from core.middleware import CookieJWTAuthentication
 from rest_framework.generics import ListAPIView,CreateAPIView,DestroyAPIView
 from .serializer import ChatSerializer, MessageSerializer
 from enum import Enum
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any
+
+# Páginas ya renderizadas de los reportes guardados (los artefactos no cambian)
+report_cache = get_cache("reports")
 
 class IntentType(Enum):
     CONVERSATION = "conversation"
@@ -33,80 +53,195 @@ class ParsedIntent:
 
 class DataManager:
     @staticmethod
-    def get_dataframe(file_path, sheet_name="DETALLE", cache_timeout=3600):
-        cache_key = f"excel_data_{hash(str(file_path))}_{sheet_name}"
-        df = cache.get(cache_key)
-        if df is not None:
-            return df
+    def get_version(file_path, sheet_name="DETALLE", sort_by=(), columns=None):
+        dataset_watcher.ensure_started()
         try:
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            cache.set(cache_key, df, timeout=cache_timeout)
-            return df
+            return dataset_store.get(file_path, sheet_name, sort_by, columns)
         except Exception as e:
             raise ValueError(f"Error al leer archivo Excel: {str(e)}")
 
-class ClientMatcher:
-    @staticmethod
-    def find_best_client_match(search_text, client_list):
-        if not client_list:
-            return None
-        best_score = 0
-        best_client = None
-        for client in client_list:
-            if pd.isna(client):
-                continue
-            score = SequenceMatcher(None, search_text.lower(), str(client).lower()).ratio()
-            if score > best_score:
-                best_score = score
-                best_client = client
-        return best_client if best_score > 0.3 else None
-
 class ReportingService:
+    # El snapshot se guarda ordenado por estas columnas para indexarlas por rangos
+    INDEX_COLUMNS = ("Empresa", "Producto")
+    # Columnas por las que se puede filtrar un rango de fechas
+    DATE_COLUMNS = {"cuota": "Fecha Venc.Cuota", "vencimiento": "Fecha Vencimiento"}
+    # Columnas que devuelve get_filtered_data
+    REPORT_COLUMNS = ("Empresa", "Fecha Venc.Cuota", "Producto", "Capital", "Capital L/P", "Capital Divisa", "Fecha Vencimiento", "weekmonth")
+    # Proyección que se carga del Excel: reporte, filtros y agrupaciones
+    DATASET_COLUMNS = tuple(dict.fromkeys(
+        INDEX_COLUMNS + REPORT_COLUMNS + tuple(DATE_COLUMNS.values()) + tuple(column for column, _ in GROUPINGS.values())
+    ))
+
     def __init__(self, excel_file_path=None):
         self.excel_file_path = excel_file_path or self._get_default_path()
         self.data_manager = DataManager()
-        self.client_matcher = ClientMatcher()
+        self._versions = {}
     
     def _get_default_path(self):
-        return settings.MEDIA_ROOT / "xlsx/Run Off BEC 202505_ejecutado 2904 - CARLOS RONCEROS VILCHEZ.xlsx"
-    
-    def get_dataset(self):
-        return self.data_manager.get_dataframe(self.excel_file_path)
+        # El run-off más reciente del catálogo; si no hay ninguno, el libro histórico
+        return dataset_registry.default_path() or os.path.join(
+            settings.MEDIA_ROOT, "xlsx", "Run Off BEC 202505_ejecutado 2904 - CARLOS RONCEROS VILCHEZ.xlsx"
+        )
     
+    def get_version(self, extra_columns=()):
+        """
+        Versión con las columnas declaradas en DATASET_COLUMNS. Si un reporte
+        necesita otras, se carga aparte (y una sola vez) la proyección ampliada.
+        """
+        extra = tuple(column for column in extra_columns if column not in self.DATASET_COLUMNS)
+        columns = self.DATASET_COLUMNS + extra
+        # Se crea un servicio por solicitud: toda la solicitud usa la misma
+        # versión aunque el watcher publique otra mientras tanto
+        if extra not in self._versions:
+            self._versions[extra] = self.data_manager.get_version(
+                self.excel_file_path, sort_by=self.INDEX_COLUMNS, columns=columns
+            )
+        return self._versions[extra]
+
+    def get_metadata(self) -> DatasetMetadata:
+        return self.get_version().metadata
+
     def get_client_list(self):
-        df: pd.DataFrame = self.get_dataset()
-        if "Empresa" not in df.columns:
+        metadata = self.get_metadata()
+        if "Empresa" not in metadata.columns:
             raise ValueError('Columna empresa no encontrada')
-        return df["Empresa"].dropna().unique().tolist()
-    
+        return metadata.clients
+
+    def get_client_matcher(self) -> ClientMatcher:
+        version = self.get_version()
+        return version.derive("client_matcher", lambda df: ClientMatcher(version.metadata.clients))
+
+    def get_intent_rules(self) -> IntentRules:
+        version = self.get_version()
+        return version.derive(
+            "intent_rules", lambda df: IntentRules(version.metadata.clients, version.metadata.products)
+        )
+
     def find_client_by_text(self, search_text):
-        clients = self.get_client_list()
-        return self.client_matcher.find_best_client_match(search_text, clients)
+        return self.get_client_matcher().find_best_client_match(search_text)
 
-    def get_filtered_data(self, client_name=None, product=None, date_from=None, date_to=None):
-        """Filtra los datos según múltiples criterios"""
-        df = self.get_dataset()
-        
+    def get_report_stats(self, client_name, product=None):
+        """Cantidad de registros y productos del cliente, leídos del índice"""
+        return self.get_version().group_index.client_stats(client_name, product)
+
+    def get_date_index(self, date_column, by_client=True) -> DateIndex:
+        return self.get_version().date_index(date_column, "Empresa" if by_client else None)
+
+    def _date_column(self, date_field=None):
+        """Columna de fecha a filtrar: Fecha Venc.Cuota salvo que se pida el vencimiento"""
+        if date_field in self.DATE_COLUMNS.values():
+            return date_field
+        if date_field and "vencimiento" in str(date_field).lower() and "cuota" not in str(date_field).lower():
+            return self.DATE_COLUMNS["vencimiento"]
+        return self.DATE_COLUMNS["cuota"]
+
+    def _select_rows(self, version, client_name=None, product=None, date_from=None, date_to=None, date_field=None):
+        """Filas que cumplen los filtros: un slice si basta el índice, si no un arreglo de posiciones"""
+        frame = version.frame
+        index = version.group_index
+
+        if date_from is None and date_to is None:
+            rows = slice(None)
+            if client_name:
+                rows = slice(*index.client_range(client_name, product))
+            if product and not (client_name and index.has_products) and "Producto" in frame.columns:
+                rows = np.flatnonzero((frame["Producto"].iloc[rows] == product).to_numpy()) + (rows.start or 0)
+            return rows
+
+        date_column = self._date_column(date_field)
         if client_name:
-            df = df[df["Empresa"] == client_name]
-        if product:
-            df = df[df["Producto"] == product] if "Producto" in df.columns else df
-        
-        return df[["Empresa","Fecha Venc.Cuota","Producto","Capital","Capital L/P","Capital Divisa","Fecha Vencimiento","weekmonth"]]
+            start, stop = index.client_range(client_name)
+            rows = self.get_date_index(date_column).positions(start, stop, date_from, date_to)
+        else:
+            rows = self.get_date_index(date_column, by_client=False).positions(0, len(frame), date_from, date_to)
+        if product and "Producto" in frame.columns:
+            rows = rows[(frame["Producto"].iloc[rows] == product).to_numpy()]
+        return rows
+
+    def get_filtered_data(self, client_name=None, product=None, date_from=None, date_to=None, date_field=None, columns=None):
+        """Filtra los datos según múltiples criterios; columns reemplaza a REPORT_COLUMNS"""
+        columns = tuple(columns or self.REPORT_COLUMNS)
+        version = self.get_version(columns)
+        rows = self._select_rows(
+            version, client_name, product, parse_date(date_from), parse_date(date_to, end=True), date_field
+        )
+        # Solo se copian las filas y columnas del reporte, no el dataset
+        return version.view(rows, columns)
+
+    def get_aggregation(self, group_by, client_name=None, product=None, date_from=None, date_to=None, date_field=None):
+        """
+        Registros y sumas de Capital agrupados por weekmonth, product, month
+        o currency. Se cachea por (versión, cliente, filtros, agrupación).
+        """
+        grouping = normalize_grouping(group_by)
+        if grouping is None:
+            raise ValueError(f"Agrupación no soportada: {group_by}")
+        version = self.get_version()
+        engine = version.aggregations
+        date_from, date_to = parse_date(date_from), parse_date(date_to, end=True)
+        date_column = self._date_column(date_field) if date_from is not None or date_to is not None else None
+        rows = self._select_rows(version, client_name, product, date_from, date_to, date_field)
+        return engine.aggregate(grouping, rows, key=(client_name, product, date_from, date_to, date_column))
 
 class IntentParser:
     """Clase que maneja la interpretación de intenciones usando IA"""
     
-    def __init__(self):
-        self.reporting_service = ReportingService()
+    def __init__(self, reporting_service: Optional[ReportingService] = None):
+        self.reporting_service = reporting_service or ReportingService()
     
-    def parse_user_intent(self, user_message: str, conversation_history: List[Dict] = None) -> ParsedIntent:
+    def parse_user_intent(self, user_message: str, context: Optional[ConversationContext] = None) -> ParsedIntent:
         """
-        Analiza el mensaje del usuario y determina la intención
+        Analiza el mensaje del usuario y determina la intención. Los casos
+        evidentes se resuelven con reglas locales; el resto va a Gemini.
         """
-        context = self._build_context(conversation_history) if conversation_history else ""
+        intent = self._classify_locally(user_message)
+        if intent is not None:
+            intent_metrics.record("local")
+            return intent
+        try:
+            prompt = self._build_prompt(user_message, context)
+            response = Model.gemini(prompt=prompt, modelname="gemini-1.5-flash", temperature=0)
+            intent = self._parse_response(response)
+            intent_metrics.record("llm")
+            return intent
+        except Exception as e:
+            # Fallback: interpretación básica
+            intent_metrics.record("fallback")
+            return self._fallback_intent_parsing(user_message)
+
+    async def aparse_user_intent(self, user_message: str, context: Optional[ConversationContext] = None) -> ParsedIntent:
+        """Versión asíncrona: el trabajo con pandas se ejecuta en el pool de hilos"""
+        intent = await sync_to_async(self._classify_locally, thread_sensitive=False)(user_message)
+        if intent is not None:
+            intent_metrics.record("local")
+            return intent
+        try:
+            prompt = await sync_to_async(self._build_prompt, thread_sensitive=False)(user_message, context)
+            response = await Model.agemini(prompt=prompt, modelname="gemini-1.5-flash", temperature=0)
+            intent = await sync_to_async(self._parse_response, thread_sensitive=False)(response)
+            intent_metrics.record("llm")
+            return intent
+        except Exception as e:
+            intent_metrics.record("fallback")
+            return self._fallback_intent_parsing(user_message)
+
+    def _classify_locally(self, user_message: str) -> Optional[ParsedIntent]:
+        """Primera etapa: reglas locales; None si el mensaje necesita al modelo"""
+        try:
+            parsed_data = self.reporting_service.get_intent_rules().classify(user_message)
+        except Exception:
+            return None
+        if parsed_data is None:
+            return None
+        return ParsedIntent(
+            intent_type=IntentType(parsed_data["intent_type"]),
+            confidence=parsed_data["confidence"],
+            entities=parsed_data["entities"],
+            response_text=parsed_data.get("response_text")
+        )
+
+    def _build_prompt(self, user_message: str, conversation_context: Optional[ConversationContext] = None) -> str:
+        context = conversation_context.render() if conversation_context else ""
         available_clients = self.reporting_service.get_client_list()[:10]  # Primeros 10 para no saturar
         
         prompt = f"""
@@ -118,6 +253,9 @@ CONTEXTO DE CONVERSACIÓN PREVIA:
 CLIENTES DISPONIBLES (algunos ejemplos):
 {', '.join(available_clients)}
 
+DATASETS DISPONIBLES (por defecto el más reciente):
+{', '.join(dataset_registry.labels())}
+
 MENSAJE DEL USUARIO: "{user_message}"
 
 Analiza el mensaje y determina la intención. Responde ÚNICAMENTE con un JSON válido siguiendo esta estructura:
@@ -128,8 +266,11 @@ Analiza el mensaje y determina la intención. Responde ÚNICAMENTE con un JSON v
     "entities": {{
         "client_name": "nombre del cliente si se menciona",
         "product": "tipo de producto si se menciona (LEASING, COMERCIAL, FIANZAS, etc.)",
-        "date_from": "fecha inicial si se menciona",
-        "date_to": "fecha final si se menciona",
+        "date_from": "fecha inicial si se menciona (AAAA-MM-DD o como la escribió el usuario)",
+        "date_to": "fecha final si se menciona (AAAA-MM-DD o como la escribió el usuario)",
+        "date_field": "cuota|vencimiento según a qué fecha se refiera el rango, null si no hay fechas",
+        "group_by": "weekmonth|product|month|currency si piden totales agrupados, null si no",
+        "dataset": "dataset de la lista si piden otro archivo o periodo de run-off, null si no",
         "filters": ["lista de filtros mencionados"]
     }},
     "response_text": "respuesta natural para conversación normal, null para reportes"
@@ -144,49 +285,35 @@ REGLAS:
 - Para conversación normal, incluye response_text con una respuesta natural
 - Para reportes, response_text debe ser null
 """
+        return prompt
 
-        try:
-            response = Model.gemini(prompt=prompt, modelname="gemini-1.5-flash")
-            # Limpiar respuesta por si tiene markdown
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:-3]
-            elif clean_response.startswith('```'):
-                clean_response = clean_response[3:-3]
-            
-            parsed_data = json.loads(clean_response)
-            
-            # Validar y corregir nombres de clientes
-            if parsed_data.get("entities", {}).get("client_name"):
-                best_match = self.reporting_service.find_client_by_text(
-                    parsed_data["entities"]["client_name"]
-                )
-                if best_match:
-                    parsed_data["entities"]["client_name"] = best_match
-            
-            return ParsedIntent(
-                intent_type=IntentType(parsed_data["intent_type"]),
-                confidence=parsed_data["confidence"],
-                entities=parsed_data["entities"],
-                response_text=parsed_data.get("response_text")
-            )
-            
-        except Exception as e:
-            # Fallback: interpretación básica
-            return self._fallback_intent_parsing(user_message)
-    
-    def _build_context(self, conversation_history: List[Dict]) -> str:
-        """Construye el contexto de conversación"""
-        if not conversation_history:
-            return ""
+    def _parse_response(self, response: str) -> ParsedIntent:
+        """Convierte la respuesta JSON del modelo en un ParsedIntent"""
+        # Limpiar respuesta por si tiene markdown
+        clean_response = response.strip()
+        if clean_response.startswith('```json'):
+            clean_response = clean_response[7:-3]
+        elif clean_response.startswith('```'):
+            clean_response = clean_response[3:-3]
+        
+        parsed_data = json.loads(clean_response)
         
-        context_lines = []
-        for msg in conversation_history[-5:]:  # Últimos 5 mensajes
-            sender = msg.get('sender', 'unknown')
-            text = msg.get('message_text', '')
-            context_lines.append(f"{sender}: {text}")
+        # Validar y corregir nombres de clientes
+        if parsed_data.get("entities", {}).get("client_name"):
+            best_match = self.reporting_service.find_client_by_text(
+                parsed_data["entities"]["client_name"]
+            )
+            if best_match:
+                parsed_data["entities"]["client_name"] = best_match
+        if parsed_data.get("entities", {}).get("group_by"):
+            parsed_data["entities"]["group_by"] = normalize_grouping(parsed_data["entities"]["group_by"])
         
-        return "\n".join(context_lines)
+        return ParsedIntent(
+            intent_type=IntentType(parsed_data["intent_type"]),
+            confidence=parsed_data["confidence"],
+            entities=parsed_data["entities"],
+            response_text=parsed_data.get("response_text")
+        )
     
     def _fallback_intent_parsing(self, user_message: str) -> ParsedIntent:
         """Análisis básico de intención como fallback"""
@@ -211,6 +338,9 @@ REGLAS:
                 response_text="Entiendo, ¿en qué más puedo ayudarte?"
             )
 
+# Pool para pedir el resumen a Gemini mientras se arma la tabla
+summary_executor = ThreadPoolExecutor(max_workers=settings.REPORT_SUMMARY_WORKERS, thread_name_prefix="report-summary")
+
 class ReportGenerator:
     """Clase especializada en generar reportes"""
     
@@ -225,160 +355,345 @@ class ReportGenerator:
         product = entities.get("product")
         
         if not client_name:
-            return {
-                "success": False,
-                "error": "No se pudo identificar el cliente para el reporte",
-                "suggestion": "Por favor, especifica el nombre del cliente"
-            }
+            return self._missing_client_result()
         
         try:
+            # Las estadísticas del resumen salen del índice: la llamada a
+            # Gemini arranca antes de filtrar y renderizar la tabla
+            aggregation = self._aggregate(client_name, product, entities)
+            stats = self._index_stats(client_name, product, entities, aggregation)
+            pending_summary = self._submit_summary(stats, entities) if stats else None
+
             # Obtener datos filtrados
-            filtered_data = self.reporting_service.get_filtered_data(
-                client_name=client_name,
-                product=product
-            )
+            filtered_data = self.reporting_service.get_filtered_data(**self._filters(entities))
             
             if filtered_data.empty:
-                return {
-                    "success": False,
-                    "error": f"No se encontraron datos para el cliente: {client_name}",
-                    "available_clients": self.reporting_service.get_client_list()[:5]
-                }
+                return self._no_data_result(client_name)
+
+            if pending_summary is None:
+                pending_summary = self._submit_summary(self._summary_stats(filtered_data, entities, aggregation), entities)
+            
+            # Serializar el resultado para guardarlo junto al mensaje
+            report = encode_report(filtered_data if aggregation is None else aggregation)
             
-            # Generar tabla HTML
-            html_table = self._format_as_html_table(filtered_data)
+            # Esperar el resumen con IA hasta el plazo; si no, texto por defecto
+            summary = self._wait_summary(pending_summary, len(filtered_data), entities)
             
-            # Generar resumen con IA
-            summary = self._generate_summary(filtered_data, entities)
+            return self._success_result(filtered_data, report, summary, entities, aggregation)
             
+        except Exception as e:
             return {
-                "success": True,
-                "data": {
-                    "html_table": html_table,
-                    "summary": summary,
-                    "client_name": client_name,
-                    "total_records": len(filtered_data),
-                    "filters_applied": entities
-                }
+                "success": False,
+                "error": f"Error generando reporte: {str(e)}"
             }
-            
+
+    async def agenerate_report(self, intent: ParsedIntent) -> Dict[str, Any]:
+        """Versión asíncrona de generate_report; pandas corre en el pool de hilos"""
+        entities = intent.entities
+        client_name = entities.get("client_name")
+        product = entities.get("product")
+
+        if not client_name:
+            return self._missing_client_result()
+
+        summary_task = None
+        try:
+            aggregation = await sync_to_async(self._aggregate, thread_sensitive=False)(client_name, product, entities)
+            stats = await sync_to_async(self._index_stats, thread_sensitive=False)(client_name, product, entities, aggregation)
+            if stats:
+                summary_task = asyncio.ensure_future(self._agenerate_summary(stats, entities))
+            deadline = time.monotonic() + settings.REPORT_SUMMARY_TIMEOUT
+
+            filtered_data = await sync_to_async(self.reporting_service.get_filtered_data, thread_sensitive=False)(
+                **self._filters(entities)
+            )
+            if filtered_data.empty:
+                return self._no_data_result(client_name)
+            if summary_task is None:
+                summary_task = asyncio.ensure_future(
+                    self._agenerate_summary(self._summary_stats(filtered_data, entities, aggregation), entities)
+                )
+
+            report = await sync_to_async(encode_report, thread_sensitive=False)(
+                filtered_data if aggregation is None else aggregation
+            )
+            try:
+                summary = await asyncio.wait_for(summary_task, max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                summary = self._fallback_summary(len(filtered_data), entities)
+            return self._success_result(filtered_data, report, summary, entities, aggregation)
+
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Error generando reporte: {str(e)}"
             }
+        finally:
+            if summary_task is not None and not summary_task.done():
+                summary_task.cancel()
+
+    def _missing_client_result(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": "No se pudo identificar el cliente para el reporte",
+            "suggestion": "Por favor, especifica el nombre del cliente"
+        }
+
+    def _no_data_result(self, client_name: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": f"No se encontraron datos para el cliente: {client_name}",
+            "available_clients": self.reporting_service.get_client_list()[:5]
+        }
+
+    def _success_result(self, df: pd.DataFrame, report: Dict, summary: str, entities: Dict,
+                        aggregation: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        data = {
+            "summary": summary,
+            "client_name": entities.get("client_name"),
+            "total_records": len(df),
+            "filters_applied": entities
+        }
+        if aggregation is not None:
+            data["aggregation"] = {
+                "group_by": entities.get("group_by"),
+                "rows": aggregation.to_dict("records")
+            }
+        return {
+            "success": True,
+            "report": report,
+            "data": data
+        }
     
-    def _format_as_html_table(self, df: pd.DataFrame) -> str:
-        """Formatea DataFrame como tabla HTML"""
-        if df.empty:
-            return "<p>No se encontraron datos para mostrar.</p>"
-        
-        return df.to_html(
-            index=False,
-            classes='table table-striped table-bordered',
-            escape=False,
-            float_format='{:.2f}'.format
-        )
-    
-    def _generate_summary(self, df: pd.DataFrame, entities: Dict) -> str:
-        """Genera un resumen inteligente de los datos"""
+    def _filters(self, entities: Dict) -> Dict[str, Any]:
+        """Argumentos de filtrado para ReportingService a partir de las entidades"""
+        return {
+            "client_name": entities.get("client_name"),
+            "product": entities.get("product"),
+            "date_from": entities.get("date_from"),
+            "date_to": entities.get("date_to"),
+            "date_field": entities.get("date_field"),
+        }
+
+    def _period(self, entities: Dict) -> Optional[str]:
+        if not (entities.get("date_from") or entities.get("date_to")):
+            return None
+        return f"{entities.get('date_from') or 'inicio'} a {entities.get('date_to') or 'fin'}"
+
+    def _aggregate(self, client_name: str, product: Optional[str], entities: Dict) -> Optional[pd.DataFrame]:
+        """Totales agrupados si la intención pide group_by; None si no aplica"""
+        group_by = normalize_grouping(entities.get("group_by"))
+        if not group_by:
+            return None
         try:
-            stats = {
-                "total_records": len(df),
-                "products": df["Producto"].unique().tolist() if "Producto" in df.columns else [],
-                "client": entities.get("client_name", "N/A")
-            }
-            
-            prompt = f"""
+            return self.reporting_service.get_aggregation(group_by, **self._filters(entities))
+        except ValueError:
+            return None
+
+    def _index_stats(self, client_name: str, product: Optional[str], entities: Dict,
+                     aggregation: Optional[pd.DataFrame] = None) -> Optional[Dict]:
+        """Estadísticas del resumen a partir del índice; None si no aplica"""
+        if self._period(entities):
+            # El índice no conoce el rango de fechas: se resume tras filtrar
+            return None
+        stats = self.reporting_service.get_report_stats(client_name, product)
+        if not stats or not stats["total_records"]:
+            return None
+        return {**stats, "client": entities.get("client_name", "N/A"), "aggregation": aggregation}
+
+    def _summary_stats(self, df: pd.DataFrame, entities: Dict, aggregation: Optional[pd.DataFrame] = None) -> Dict:
+        return {
+            "total_records": len(df),
+            "products": df["Producto"].unique().tolist() if "Producto" in df.columns else [],
+            "client": entities.get("client_name", "N/A"),
+            "period": self._period(entities),
+            "aggregation": aggregation
+        }
+
+    def _summary_prompt(self, stats: Dict) -> str:
+        return f"""
 Genera un resumen ejecutivo breve y profesional basado en estos datos:
 
 Cliente: {stats['client']}
 Total de registros: {stats['total_records']}
 Productos: {', '.join(stats['products']) if stats['products'] else 'No especificados'}
-
+{f"Periodo: {stats['period']}" if stats.get('period') else ''}
+{self._aggregation_prompt(stats.get('aggregation'))}
 El resumen debe ser conciso (2-3 oraciones) y orientado a negocio.
 """
-            
-            summary = Model.gemini(prompt=prompt, modelname="gemini-1.5-flash")
+
+    def _aggregation_prompt(self, aggregation: Optional[pd.DataFrame]) -> str:
+        """Totales ya calculados para que el modelo no tenga que sumarlos"""
+        if aggregation is None or aggregation.empty:
+            return ""
+        return f"Totales agrupados:\n{aggregation.head(24).to_string(index=False)}\n"
+
+    def _fallback_summary(self, total_records: int, entities: Dict) -> str:
+        return f"Reporte generado para {entities.get('client_name', 'cliente')} con {total_records} registros encontrados."
+    
+    def _generate_summary(self, stats: Dict, entities: Dict) -> str:
+        """Genera un resumen inteligente de los datos"""
+        try:
+            summary = Model.gemini(prompt=self._summary_prompt(stats), modelname="gemini-1.5-flash", temperature=0)
             return summary.strip()
-            
         except Exception:
-            return f"Reporte generado para {entities.get('client_name', 'cliente')} con {len(df)} registros encontrados."
+            return self._fallback_summary(stats["total_records"], entities)
 
-class ChatMessageCreateView(APIView):
-    permission_classes = [IsAuthenticated]
-    authentication_classes = [CookieJWTAuthentication]
-    
-    def post(self, request, *args, **kwargs):
+    def _submit_summary(self, stats: Dict, entities: Dict):
+        """Lanza el resumen en segundo plano; devuelve (future, plazo)"""
+        future = summary_executor.submit(self._generate_summary, stats, entities)
+        return future, time.monotonic() + settings.REPORT_SUMMARY_TIMEOUT
+
+    def _wait_summary(self, pending, total_records: int, entities: Dict) -> str:
+        future, deadline = pending
         try:
-            user = request.user
-            text = request.data["message_text"]
-            chat_id = request.data.get("chat_id")
-            # Obtener o crear chat
-            if chat_id:
-                chat = Chat.objects.get(pk=chat_id, user=user)
-            else:
-                chat = Chat.objects.create(user=user, title=f"{text[:50]}")
-            conversation_history = list(
-                Message.objects.filter(chat=chat)
-                .order_by('-created_at')[:10]
-                .values('sender', 'message_text')
-            )
-            # Parsear intención
-            intent_parser = IntentParser()
-            print(conversation_history,123123)
-            intent = intent_parser.parse_user_intent(text, conversation_history)
-            print(intent)
-            response_data = self._process_intent(intent)
-            ai_response_text = self._extract_response_text(response_data, intent)
-            instance = Message.objects.create(chat=chat, sender="ai", message_text=ai_response_text)
-            data = {
-                "data" :instance.toJSON(),
-                "success":True
-            }
-            return Response(data=data, status=HTTP_200_OK)
-            
-        except Exception as e:
-            return Response(data={
-                "error": str(e),
-                "success": False
-            }, status=HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _process_intent(self, intent: ParsedIntent) -> Dict[str, Any]:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:
+            # Plazo vencido: se responde con el resumen por defecto
+            return self._fallback_summary(total_records, entities)
+
+    async def _agenerate_summary(self, stats: Dict, entities: Dict) -> str:
+        try:
+            summary = await Model.agemini(prompt=self._summary_prompt(stats), modelname="gemini-1.5-flash", temperature=0)
+            return summary.strip()
+        except Exception:
+            return self._fallback_summary(stats["total_records"], entities)
+
+    async def astream_summary(self, stats: Dict, entities: Dict):
+        """Entrega el resumen en fragmentos a medida que Gemini los genera"""
+        emitted = False
+        try:
+            async for chunk in Model.astream_gemini(prompt=self._summary_prompt(stats), modelname="gemini-1.5-flash", temperature=0):
+                emitted = True
+                yield chunk
+        except Exception:
+            if not emitted:
+                yield self._fallback_summary(stats["total_records"], entities)
+
+class ChatPipelineMixin:
+    """Pasos comunes del flujo de chat, compartidos por las vistas síncrona y asíncrona"""
+
+    def _load_context(self, chat: Chat, existing: bool) -> ConversationContext:
+        """Contexto guardado en el chat; los chats anteriores a él se reconstruyen una vez"""
+        if chat.context or not existing:
+            return ConversationContext(chat.context)
+        recent = list(
+            Message.objects.filter(chat=chat)
+            .order_by('-created_at', '-id')[:settings.CHAT_CONTEXT_TURNS]
+            .values('sender', 'message_text')
+        )
+        return ConversationContext.from_messages(reversed(recent))
+
+    def _update_context(self, chat: Chat, context: ConversationContext, text: str,
+                        response_data: Dict, intent: ParsedIntent):
+        context.add("user", text)
+        context.add("ai", self._context_digest(response_data, intent))
+        chat.context = context.turns
+
+    def _context_digest(self, response_data: Dict, intent: ParsedIntent) -> str:
+        """Versión de una línea de la respuesta para el contexto (sin tablas)"""
+        data = response_data.get("data")
+        if response_data.get("type") == "report" and response_data.get("success"):
+            digest = f"[Reporte] {data.get('client_name')}: {data.get('total_records')} registros"
+            product = (data.get("filters_applied") or {}).get("product")
+            if product:
+                digest += f", producto {product}"
+            filters = data.get("filters_applied") or {}
+            if filters.get("date_from") or filters.get("date_to"):
+                digest += f", del {filters.get('date_from') or 'inicio'} al {filters.get('date_to') or 'fin'}"
+            if data.get("aggregation"):
+                digest += f", agrupado por {data['aggregation']['group_by']}"
+            return f"{digest}. {data.get('summary', '')}"
+        if response_data.get("type") == "client_info" and isinstance(data, dict):
+            return f"[Info cliente] {data.get('client')}: {data.get('total_records')} registros, productos {', '.join(map(str, data.get('products', [])))}"
+        return self._extract_response_text(response_data, intent)
+
+    def _build_artifact(self, instance: Message, response_data: Dict, intent: ParsedIntent) -> Optional[ReportArtifact]:
+        report = response_data.get("report")
+        if not report:
+            return None
+        return ReportArtifact(
+            message=instance,
+            client_name=response_data["data"].get("client_name") or "",
+            filters=intent.entities,
+            **report
+        )
+
+    def _message_json(self, instance: Message, artifact: Optional[ReportArtifact]) -> Dict:
+        item = instance.toJSON()
+        item["report"] = artifact.toJSON() if artifact else None
+        return item
+
+    def _route_dataset(self, intent: ParsedIntent, reporting_service: ReportingService) -> ReportingService:
+        """Servicio sobre el dataset que pide la intención (entidad dataset), o el actual"""
+        path = dataset_registry.resolve(intent.entities.get("dataset"))
+        if path is None or path == reporting_service.excel_file_path:
+            return reporting_service
+        routed = ReportingService(path)
+        client_name = intent.entities.get("client_name")
+        if client_name:
+            intent.entities["client_name"] = routed.find_client_by_text(client_name) or client_name
+        return routed
+
+    def _process_intent(self, intent: ParsedIntent, reporting_service: ReportingService) -> Dict[str, Any]:
         """Procesa la intención y retorna la respuesta apropiada"""
         
         if intent.intent_type == IntentType.CONVERSATION:
-            return {
-                "success": True,
-                "type": "conversation",
-                "data": intent.response_text or "¿En qué puedo ayudarte hoy?"
-            }
+            return self._conversation_result(intent)
         
         elif intent.intent_type in [IntentType.REPORT_REQUEST, IntentType.REPORT_FILTER]:
-            reporting_service = ReportingService()
             report_generator = ReportGenerator(reporting_service)
             report_result = report_generator.generate_report(intent)
-            
-            return {
-                "success": report_result["success"],
-                "type": "report",
-                "data": report_result.get("data"),
-                "error": report_result.get("error"),
-                "suggestion": report_result.get("suggestion"),
-                "available_clients": report_result.get("available_clients")
-            }
+            return self._report_result(report_result)
         
         elif intent.intent_type == IntentType.CLIENT_INFO:
-            return self._handle_client_info(intent)
+            return self._handle_client_info(intent, reporting_service)
         
         else:
-            return {
-                "success": True,
-                "type": "conversation",
-                "data": "No estoy seguro de cómo ayudarte con eso. ¿Podrías ser más específico?"
-            }
+            return self._unknown_result()
+
+    async def _aprocess_intent(self, intent: ParsedIntent, reporting_service: ReportingService) -> Dict[str, Any]:
+        """Versión asíncrona de _process_intent"""
+        if intent.intent_type == IntentType.CONVERSATION:
+            return self._conversation_result(intent)
+
+        elif intent.intent_type in [IntentType.REPORT_REQUEST, IntentType.REPORT_FILTER]:
+            report_generator = ReportGenerator(reporting_service)
+            report_result = await report_generator.agenerate_report(intent)
+            return self._report_result(report_result)
+
+        elif intent.intent_type == IntentType.CLIENT_INFO:
+            return await sync_to_async(self._handle_client_info, thread_sensitive=False)(intent, reporting_service)
+
+        else:
+            return self._unknown_result()
+
+    def _conversation_result(self, intent: ParsedIntent) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "type": "conversation",
+            "data": intent.response_text or "¿En qué puedo ayudarte hoy?"
+        }
+
+    def _report_result(self, report_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": report_result["success"],
+            "type": "report",
+            "data": report_result.get("data"),
+            "report": report_result.get("report"),
+            "error": report_result.get("error"),
+            "suggestion": report_result.get("suggestion"),
+            "available_clients": report_result.get("available_clients")
+        }
+
+    def _unknown_result(self) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "type": "conversation",
+            "data": "No estoy seguro de cómo ayudarte con eso. ¿Podrías ser más específico?"
+        }
     
-    def _handle_client_info(self, intent: ParsedIntent) -> Dict[str, Any]:
+    def _handle_client_info(self, intent: ParsedIntent, reporting_service: ReportingService) -> Dict[str, Any]:
         """Maneja solicitudes de información específica del cliente"""
         client_name = intent.entities.get("client_name")
         
@@ -390,7 +705,6 @@ class ChatMessageCreateView(APIView):
             }
         
         try:
-            reporting_service = ReportingService()
             client_data = reporting_service.get_filtered_data(client_name=client_name)
             
             if client_data.empty:
@@ -428,16 +742,13 @@ class ChatMessageCreateView(APIView):
         elif response_data.get("type") == "report":
             if response_data.get("success"):
                 summary = response_data["data"].get("summary", "")
-                html_table = response_data["data"].get("html_table", "")
                 client_name = intent.entities.get('client_name') or response_data["data"].get("client_name", "cliente")
 
+                # La tabla se guarda aparte en ReportArtifact y se pide por páginas
                 return f"""
                     <div>
                         <p><strong>Reporte generado para:</strong> {client_name}</p>
                         <p>{summary}</p>
-                        <div style="overflow-x: auto; margin-top: 1em;">
-                            {html_table}
-                        </div>
                     </div>
                 """
             else:
@@ -446,6 +757,245 @@ class ChatMessageCreateView(APIView):
         else:
             return str(response_data.get("data", "Respuesta procesada"))
 
+class ChatMessageCreateView(ChatPipelineMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CookieJWTAuthentication]
+    
+    def post(self, request, *args, **kwargs):
+        try:
+            user = request.user
+            text = request.data["message_text"]
+            chat_id = request.data.get("chat_id")
+            # Obtener o crear chat
+            if chat_id:
+                chat = Chat.objects.get(pk=chat_id, user_id=user.id)
+            else:
+                chat = Chat.objects.create(user_id=user.id, title=f"{text[:50]}")
+            context = self._load_context(chat, bool(chat_id))
+            # Parsear intención
+            reporting_service = ReportingService()
+            intent_parser = IntentParser(reporting_service)
+            intent = intent_parser.parse_user_intent(text, context)
+            reporting_service = self._route_dataset(intent, reporting_service)
+            response_data = self._process_intent(intent, reporting_service)
+            ai_response_text = self._extract_response_text(response_data, intent)
+            instance = Message.objects.create(chat=chat, sender="ai", message_text=ai_response_text)
+            artifact = self._build_artifact(instance, response_data, intent)
+            if artifact:
+                artifact.save()
+            self._update_context(chat, context, text, response_data, intent)
+            chat.save(update_fields=["context", "update_at"])
+            data = {
+                "data" :self._message_json(instance, artifact),
+                "success":True
+            }
+            return Response(data=data, status=HTTP_200_OK)
+            
+        except Exception as e:
+            return Response(data={
+                "error": str(e),
+                "success": False
+            }, status=HTTP_500_INTERNAL_SERVER_ERROR)
+    
+class ChatMessageCreateAsyncView(ChatPipelineMixin, View):
+    """
+    Variante nativa async de ChatMessageCreateView para el punto de entrada
+    ASGI. Las llamadas a Gemini y al ORM no bloquean un hilo por solicitud;
+    el filtrado con pandas se delega al pool de hilos. Solo ASGI: bajo WSGI
+    cada solicitud corre en un loop nuevo y el cliente async de Gemini
+    (compartido por el proceso) quedaría ligado a un loop ya cerrado.
+    """
+    authentication = CookieJWTAuthentication()
+
+    async def _authenticate(self, request):
+        """Devuelve (usuario, None) o (None, respuesta 401)"""
+        try:
+            user_auth = await sync_to_async(self.authentication.authenticate)(request)
+        except AuthenticationFailed as e:
+            return None, JsonResponse({"error": str(e.detail), "success": False}, status=401)
+        if user_auth is None:
+            return None, JsonResponse({"error": "Credenciales no proporcionadas", "success": False}, status=401)
+        return user_auth[0], None
+
+    async def _get_chat(self, user, text, chat_id):
+        if chat_id:
+            return await Chat.objects.aget(pk=chat_id, user_id=user.id)
+        return await Chat.objects.acreate(user_id=user.id, title=f"{text[:50]}")
+
+    async def _get_context(self, chat) -> ConversationContext:
+        if chat.context:
+            return ConversationContext(chat.context)
+        return await sync_to_async(self._load_context)(chat, True)
+
+    async def post(self, request, *args, **kwargs):
+        user, error = await self._authenticate(request)
+        if error is not None:
+            return error
+
+        try:
+            payload = json.loads(request.body or b"{}")
+            text = payload["message_text"]
+            chat = await self._get_chat(user, text, payload.get("chat_id"))
+            context = await self._get_context(chat)
+            # Resolver el libro por defecto puede leer el directorio: fuera del event loop
+            reporting_service = await sync_to_async(ReportingService, thread_sensitive=False)()
+            intent_parser = IntentParser(reporting_service)
+            intent = await intent_parser.aparse_user_intent(text, context)
+            reporting_service = await sync_to_async(self._route_dataset, thread_sensitive=False)(intent, reporting_service)
+            response_data = await self._aprocess_intent(intent, reporting_service)
+            ai_response_text = self._extract_response_text(response_data, intent)
+            instance = await Message.objects.acreate(chat=chat, sender="ai", message_text=ai_response_text)
+            artifact = self._build_artifact(instance, response_data, intent)
+            if artifact:
+                await artifact.asave()
+            self._update_context(chat, context, text, response_data, intent)
+            await chat.asave(update_fields=["context", "update_at"])
+            return JsonResponse({
+                "data": self._message_json(instance, artifact),
+                "success": True
+            }, status=HTTP_200_OK)
+
+        except Exception as e:
+            return JsonResponse({
+                "error": str(e),
+                "success": False
+            }, status=HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ChatMessageStreamView(ChatMessageCreateAsyncView):
+    """
+    Variante de chat/create que responde con Server-Sent Events: avisa en
+    cuanto recibe el mensaje, emite el resumen a medida que Gemini lo
+    genera, envía la tabla cuando está lista y guarda el Message al final.
+    """
+
+    @staticmethod
+    def _event(name: str, data) -> str:
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    @staticmethod
+    def _table_event(output_format: str, table: str, total_records: int) -> str:
+        # En formato json la tabla ya viene serializada y se inserta tal cual
+        if output_format == "json":
+            return f'event: table\ndata: {{"format":"json","table":{table},"total_records":{total_records}}}\n\n'
+        return ChatMessageStreamView._event("table", {"format": output_format, "table": table, "total_records": total_records})
+
+    async def post(self, request, *args, **kwargs):
+        user, error = await self._authenticate(request)
+        if error is not None:
+            return error
+        try:
+            payload = json.loads(request.body or b"{}")
+            text = payload["message_text"]
+            output_format = payload.get("format", "html")
+            if output_format not in REPORT_FORMATS:
+                raise ValueError(f"Formato de reporte no soportado: {output_format}")
+            chat = await self._get_chat(user, text, payload.get("chat_id"))
+        except Exception as e:
+            return JsonResponse({
+                "error": str(e),
+                "success": False
+            }, status=HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(self._stream(chat, text, output_format), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def _stream(self, chat, text, output_format="html"):
+        yield self._event("start", {"chat_id": chat.id})
+        try:
+            context = await self._get_context(chat)
+            # Resolver el libro por defecto puede leer el directorio: fuera del event loop
+            reporting_service = await sync_to_async(ReportingService, thread_sensitive=False)()
+            intent_parser = IntentParser(reporting_service)
+            intent = await intent_parser.aparse_user_intent(text, context)
+            reporting_service = await sync_to_async(self._route_dataset, thread_sensitive=False)(intent, reporting_service)
+            yield self._event("intent", {"intent_type": intent.intent_type.value, "entities": intent.entities})
+
+            if intent.intent_type in [IntentType.REPORT_REQUEST, IntentType.REPORT_FILTER]:
+                report_generator = ReportGenerator(reporting_service)
+                report_result = None
+                async for name, data in self._stream_report(report_generator, intent, output_format):
+                    if name == "result":
+                        report_result = data
+                    elif name == "table":
+                        yield self._table_event(output_format, *data)
+                    else:
+                        yield self._event(name, data)
+                response_data = self._report_result(report_result)
+            else:
+                response_data = await self._aprocess_intent(intent, reporting_service)
+                if response_data["type"] == "conversation":
+                    yield self._event("token", {"text": response_data.get("data", "")})
+                else:
+                    yield self._event("data", response_data)
+
+            if not response_data.get("success"):
+                yield self._event("error", {
+                    "error": response_data.get("error"),
+                    "suggestion": response_data.get("suggestion"),
+                    "available_clients": response_data.get("available_clients"),
+                })
+            ai_response_text = self._extract_response_text(response_data, intent)
+            instance = await Message.objects.acreate(chat=chat, sender="ai", message_text=ai_response_text)
+            artifact = self._build_artifact(instance, response_data, intent)
+            if artifact:
+                await artifact.asave()
+            self._update_context(chat, context, text, response_data, intent)
+            await chat.asave(update_fields=["context", "update_at"])
+            yield self._event("done", {"data": self._message_json(instance, artifact), "success": True})
+        except Exception as e:
+            yield self._event("done", {"error": str(e), "success": False})
+
+    async def _stream_report(self, report_generator: ReportGenerator, intent: ParsedIntent, output_format: str = "html"):
+        """Genera los eventos del reporte y termina con ("result", resultado)"""
+        entities = intent.entities
+        client_name = entities.get("client_name")
+        if not client_name:
+            yield "result", report_generator._missing_client_result()
+            return
+        try:
+            filtered_data = await sync_to_async(report_generator.reporting_service.get_filtered_data, thread_sensitive=False)(
+                **report_generator._filters(entities)
+            )
+            if filtered_data.empty:
+                yield "result", report_generator._no_data_result(client_name)
+                return
+            aggregation = await sync_to_async(report_generator._aggregate, thread_sensitive=False)(
+                client_name, entities.get("product"), entities
+            )
+            table_data = filtered_data if aggregation is None else aggregation
+
+            # La primera página de la tabla y el artefacto se preparan en paralelo
+            # mientras llegan los tokens del resumen
+            table_task = asyncio.ensure_future(
+                sync_to_async(render_report, thread_sensitive=False)(table_data.iloc[:PAGE_SIZE], output_format)
+            )
+            report_task = asyncio.ensure_future(
+                sync_to_async(encode_report, thread_sensitive=False)(table_data)
+            )
+            table_sent = False
+            chunks = []
+            stats = report_generator._summary_stats(filtered_data, entities, aggregation)
+            async for chunk in report_generator.astream_summary(stats, entities):
+                chunks.append(chunk)
+                yield "token", {"text": chunk}
+                if not table_sent and table_task.done():
+                    table_sent = True
+                    yield "table", (table_task.result(), len(filtered_data))
+            table = await table_task
+            if not table_sent:
+                yield "table", (table, len(filtered_data))
+
+            report = await report_task
+            summary = "".join(chunks).strip()
+            yield "result", report_generator._success_result(filtered_data, report, summary, entities, aggregation)
+        except Exception as e:
+            yield "result", {
+                "success": False,
+                "error": f"Error generando reporte: {str(e)}"
+            }
+
 class ChatListView(ListAPIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication]
@@ -453,7 +1003,7 @@ class ChatListView(ListAPIView):
     queryset = Chat.objects.all()
     def get(self,request,*args,**kwargs):
         try:
-            queryset = self.get_queryset().filter(user=request.user)
+            queryset = self.get_queryset().filter(user_id=request.user.id)
             serializer = self.get_serializer(queryset,many=True)
             return Response(
                 data={
@@ -467,20 +1017,129 @@ class ChatListView(ListAPIView):
                 "success":False
             },status = HTTP_400_BAD_REQUEST)
 class MessageListView(ListAPIView):
+    """
+    Historial de un chat paginado por cursor (keyset). Sin cursor devuelve
+    la página más reciente; ?before=<id> trae mensajes anteriores y
+    ?after=<id> los posteriores. Siempre en orden cronológico.
+    """
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication]
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
+    page_size = 50
+    max_page_size = 200
     def get_queryset(self):
         chat_id = self.kwargs['pk']
-        return Message.objects.filter(chat_id=chat_id)
+        # Filtrar por el dueño en la misma consulta valida el acceso al chat;
+        # del reporte solo se leen los metadatos, no el payload comprimido
+        return Message.objects.filter(chat_id=chat_id, chat__user_id=self.request.user.id).select_related(
+            'report'
+        ).defer('report__payload')
+    def _cursor_filter(self, queryset, cursor_id, newer):
+        cursor = Subquery(
+            Message.objects.filter(pk=cursor_id, chat_id=self.kwargs['pk']).values('created_at')[:1]
+        )
+        if newer:
+            return queryset.filter(Q(created_at__gt=cursor) | Q(created_at=cursor, id__gt=cursor_id))
+        return queryset.filter(Q(created_at__lt=cursor) | Q(created_at=cursor, id__lt=cursor_id))
     def get(self,request,*args,**kwargs):
         try:
+            limit = min(max(int(request.query_params.get("limit", self.page_size)), 1), self.max_page_size)
+            before = request.query_params.get("before")
+            after = request.query_params.get("after")
             queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset,many=True)
+            if after:
+                queryset = self._cursor_filter(queryset, int(after), newer=True)
+                page = list(queryset.order_by('created_at', 'id')[:limit + 1])
+                has_more = len(page) > limit
+                page = page[:limit]
+            else:
+                if before:
+                    queryset = self._cursor_filter(queryset, int(before), newer=False)
+                page = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+                has_more = len(page) > limit
+                page = page[:limit][::-1]
+            serializer = self.get_serializer(page,many=True)
             return Response(
                 data={
                     "data":serializer.data,
+                    "pagination":{
+                        "limit":limit,
+                        "has_more":has_more,
+                        "before":page[0].id if page else None,
+                        "after":page[-1].id if page else None
+                    },
+                    "success":True
+                },status=HTTP_200_OK
+            )
+        except Exception as e:
+            return Response(data={
+                "message":str(e),
+                "success":False
+            },status=HTTP_400_BAD_REQUEST)
+class ReportArtifactView(APIView):
+    """Página de un reporte guardado: ?offset=<n>&limit=<n>&format=html|json|csv"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CookieJWTAuthentication]
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= elige el formato del reporte, no el renderer de DRF
+        return super().perform_content_negotiation(request, force=True)
+    def get(self,request,pk,*args,**kwargs):
+        try:
+            # El payload solo se lee si la página no está en la caché de reportes
+            artifact = ReportArtifact.objects.defer("payload").get(pk=pk, message__chat__user_id=request.user.id)
+            offset = max(int(request.query_params.get("offset", 0)), 0)
+            limit = min(max(int(request.query_params.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            output_format = request.query_params.get("format", "html")
+            # La caché es compartida entre procesos y los ids se reutilizan tras
+            # vaciar la base: created_at distingue al artefacto
+            table = report_cache.get_or_set(
+                f"{artifact.id}:{artifact.created_at.timestamp():.6f}:{output_format}:{offset}:{limit}",
+                lambda: render_report(artifact.get_page(offset, limit), output_format)
+            )
+            if output_format == "csv":
+                response = HttpResponse(table, content_type="text/csv; charset=utf-8")
+                response["Content-Disposition"] = f'attachment; filename="reporte-{artifact.id}-{offset}.csv"'
+                return response
+            if output_format == "json":
+                # La tabla ya es JSON; se arma la respuesta sin volver a serializarla
+                meta = json.dumps({**artifact.toJSON(), "offset": offset, "limit": limit}, ensure_ascii=False)
+                return HttpResponse(
+                    f'{{"data":{{{meta[1:-1]},"table":{table}}},"success":true}}',
+                    content_type="application/json"
+                )
+            return Response(
+                data={
+                    "data":{
+                        **artifact.toJSON(),
+                        "offset":offset,
+                        "limit":limit,
+                        "html_table":table
+                    },
+                    "success":True
+                },status=HTTP_200_OK
+            )
+        except ReportArtifact.DoesNotExist:
+            return Response(data={
+                "message":"Reporte no encontrado",
+                "success":False
+            },status=HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response(data={
+                "message":str(e),
+                "success":False
+            },status=HTTP_400_BAD_REQUEST)
+class DatasetCatalogView(APIView):
+    """Libros y hojas disponibles en media/xlsx, con esquema, filas y versión"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CookieJWTAuthentication]
+    def get(self,request,*args,**kwargs):
+        try:
+            catalog = dataset_registry.catalog()
+            return Response(
+                data={
+                    "data":[info.toJSON() for info in catalog],
+                    "default":dataset_registry.default_name(),
                     "success":True
                 },status=HTTP_200_OK
             )
@@ -489,6 +1148,26 @@ class MessageListView(ListAPIView):
                 "message":str(e),
                 "success":False
             },status=HTTP_400_BAD_REQUEST)
+class IntentMetricsView(APIView):
+    """Métricas del proceso: etapa que resolvió cada intención y caché de LLM"""
+    # Con JWT_STATELESS_USER, is_staff sale del token: si se revoca con save()
+    # en otro proceso, este puede aceptarlo hasta JWT_PRINCIPAL_CACHE_TTL
+    # segundos; si se revoca con update(), hasta llamar a bump_token_version
+    permission_classes = [IsAdminUser]
+    authentication_classes = [CookieJWTAuthentication]
+    def get(self,request,*args,**kwargs):
+        return Response(
+            data={
+                "data":{
+                    "intent_tiers":intent_metrics.stats(),
+                    "llm_cache":Model.cache_stats(),
+                    "llm_single_flight":Model.flight_stats(),
+                    "datasets":dataset_store.stats(),
+                    "caches":tiered_cache_stats()
+                },
+                "success":True
+            },status=HTTP_200_OK
+        )
 class MessageCreateView(CreateAPIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieJWTAuthentication]
@@ -498,7 +1177,7 @@ class MessageCreateView(CreateAPIView):
         try:
             datos = request.data
             if datos["chat"]<0:
-                instnce = Chat.objects.create(user=request.user,title=datos["message_text"])
+                instnce = Chat.objects.create(user_id=request.user.id,title=datos["message_text"])
                 datos['chat'] = instnce.id
             serializer = self.get_serializer(data=datos)
             if not serializer.is_valid():
@@ -1,3 +1,13 @@
 from django.db import models
+from django.contrib.auth.models import User
 
 # Create your models here.
+class TokenVersion(models.Model):
+    """Versión de los tokens de un usuario; se incrementa cuando cambian sus datos"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="token_version", verbose_name="Usuario")
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        verbose_name = "Versión de token"
+        verbose_name_plural = "Versiones de token"
+        db_table = "token_versions"
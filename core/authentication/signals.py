@@ -0,0 +1,13 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .tokens import bump_token_version
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # El login solo actualiza last_login: los claims del token siguen vigentes
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    bump_token_version(instance.pk)
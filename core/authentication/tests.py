@@ -1,3 +1,65 @@
-from django.test import TestCase
+from django.contrib.auth.models import User, update_last_login
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.middleware import CookieJWTAuthentication
+
+from .tokens import UserPrincipal, bump_token_version, token_versions, tokens_for_user
 
 # Create your tests here.
+@override_settings(JWT_STATELESS_USER=True)
+class TokenVersionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("analista", password="clave")
+        # La caché es del proceso y los ids se reutilizan entre pruebas
+        token_versions.forget(self.user.pk)
+        self.auth = CookieJWTAuthentication()
+
+    def authenticate(self, token):
+        return self.auth.get_user(self.auth.get_validated_token(str(token)))
+
+    def access(self):
+        return tokens_for_user(self.user).access_token
+
+    def test_current_version_uses_the_token_claims(self):
+        token = self.access()
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, UserPrincipal)
+        self.assertEqual(user.id, self.user.pk)
+
+    def test_stale_version_loads_the_user(self):
+        token = self.access()
+        self.user.first_name = "Ana"
+        self.user.save()
+        user = self.authenticate(token)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.first_name, "Ana")
+
+    def test_missing_version_loads_the_user(self):
+        user = self.authenticate(AccessToken.for_user(self.user))
+        self.assertIsInstance(user, User)
+
+    def test_last_login_does_not_invalidate_the_claims(self):
+        token = self.access()
+        update_last_login(None, self.user)
+        self.assertIsInstance(self.authenticate(token), UserPrincipal)
+
+    def test_queryset_update_needs_an_explicit_bump(self):
+        token = self.access()
+        # update() no dispara post_save: la versión no cambia sola
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsInstance(self.authenticate(token), UserPrincipal)
+        bump_token_version(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_revoked_staff_loses_the_metrics_endpoint(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.cookies["access_token"] = str(self.access())
+        self.assertEqual(self.client.get("/api/ai/metrics/").status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/ai/metrics/").status_code, 403)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenVersion
+
+# Claim con la versión de token del usuario al momento del login
+TOKEN_VERSION_CLAIM = "ver"
+
+
+class UserPrincipal(TokenUser):
+    """
+    Usuario liviano armado solo con los claims del token (id, username,
+    is_staff, is_superuser). No tiene fila en la base: para datos
+    completos hay que cargar el User por su id.
+    """
+
+    @property
+    def token_version(self):
+        return self.token.get(TOKEN_VERSION_CLAIM)
+
+
+class TokenVersionCache:
+    """Versión vigente de cada usuario, cacheada por proceso durante ttl segundos"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id) -> int:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(user_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        version = TokenVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+        with self._lock:
+            self._versions[user_id] = (version, now + self.ttl)
+        return version
+
+    def forget(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+token_versions = TokenVersionCache(getattr(settings, "JWT_PRINCIPAL_CACHE_TTL", 60))
+
+
+def bump_token_version(user_id):
+    """
+    Invalida los claims de los tokens ya emitidos para el usuario. post_save
+    la llama al guardar un User; tras un QuerySet.update() hay que llamarla a mano.
+    """
+    updated = TokenVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    if not updated:
+        TokenVersion.objects.get_or_create(user_id=user_id, defaults={"version": 1})
+    token_versions.forget(user_id)
+
+
+def tokens_for_user(user) -> RefreshToken:
+    """Refresh token con los claims del usuario; el access token los hereda"""
+    refresh = RefreshToken.for_user(user)
+    refresh["username"] = user.get_username()
+    refresh["is_staff"] = user.is_staff
+    refresh["is_superuser"] = user.is_superuser
+    refresh[TOKEN_VERSION_CLAIM] = token_versions.get(user.pk)
+    return refresh
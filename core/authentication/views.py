@@ -1,4 +1,3 @@
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -6,6 +5,7 @@ from rest_framework.status import HTTP_200_OK,HTTP_401_UNAUTHORIZED,HTTP_400_BAD
 from django.contrib.auth import authenticate
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
+from .tokens import tokens_for_user
 # Create your views here.
 class LoginView(APIView):
     permission_classes = [AllowAny]
@@ -16,7 +16,7 @@ class LoginView(APIView):
             password = request.data.get("password")
             user = authenticate(username=username,password=password)
             if user is not None:
-                refresh = RefreshToken.for_user(user)
+                refresh = tokens_for_user(user)
                 response = Response(data={
                     "success":True,
                     "message":"Login exitoso"
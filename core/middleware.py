@@ -1,4 +1,8 @@
+from django.conf import settings
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from core.authentication.tokens import TOKEN_VERSION_CLAIM, UserPrincipal, token_versions
 
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -15,3 +19,17 @@ class CookieJWTAuthentication(JWTAuthentication):
 
         validated_token = self.get_validated_token(raw_token)
         return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        """
+        Con JWT_STATELESS_USER se arma el usuario desde los claims del token,
+        sin consultar la tabla User. Si el token no trae versión o su versión
+        quedó atrás (el usuario cambió), se carga el User desde la base.
+        """
+        if not getattr(settings, 'JWT_STATELESS_USER', False):
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get(TOKEN_VERSION_CLAIM)
+        if user_id is None or version is None or version != token_versions.get(user_id):
+            return super().get_user(validated_token)
+        return UserPrincipal(validated_token)
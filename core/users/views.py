@@ -18,7 +18,10 @@ class UserProfileView(APIView):
 
     def get(self, request, *args, **kwargs):
         try:
-            user = request.user  # Ya está autenticado, no necesitas buscarlo por ID
+            user = request.user
+            if not isinstance(user, User):
+                # El token solo trae los claims básicos: el perfil necesita el User completo
+                user = User.objects.get(pk=user.id)
             serializer = UserSerializer(user)
             return Response(data={
                 "data": serializer.data,
@@ -1,20 +1,311 @@
-from google.genai import Client
+from google.genai import Client, types
 from dotenv import load_dotenv
+from .ResponseCache import ResponseCache
+from .SingleFlight import AsyncSingleFlight, SingleFlight
+from .TieredCache import TieredCache
+import asyncio
+import httpx
 import os
+import threading
 load_dotenv()
+
+# Configuración del pool HTTP y de la concurrencia hacia los proveedores
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))
+
+# Caché de respuestas: solo para temperaturas deterministas
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH')
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '3600'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv('LLM_CACHE_MAX_TEMPERATURE', '0'))
+# Respuestas recientes en memoria del proceso, delante de la caché SQLite
+LLM_CACHE_L1_BYTES = int(os.getenv('LLM_CACHE_L1_MB', '8')) * 1024 * 1024
+
+
+class LLMBackend:
+    """Interfaz común de los proveedores de LLM"""
+    name = "base"
+
+    def generate(self, prompt, modelname, temperature):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, modelname, temperature):
+        # Por defecto se delega al método síncrono en un hilo
+        return await asyncio.to_thread(self.generate, prompt, modelname, temperature)
+
+    async def astream(self, prompt, modelname, temperature):
+        # Sin streaming nativo se entrega la respuesta completa en un solo fragmento
+        yield await self.agenerate(prompt, modelname, temperature)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Proveedor Gemini con un único Client por proceso. El transporte httpx
+    mantiene conexiones keep-alive, así que no se repite el handshake TLS.
+    El cliente async (client.aio) queda ligado al primer event loop que lo
+    usa: los endpoints async solo deben servirse con ASGI (un loop por
+    proceso), no con WSGI/runserver, que crean un loop por solicitud.
+    """
+    name = "gemini"
+
+    def __init__(self, api_key=None, timeout=LLM_TIMEOUT, max_connections=LLM_MAX_CONNECTIONS):
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    limits = httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                    )
+                    self._client = Client(
+                        api_key=self.api_key,
+                        http_options=types.HttpOptions(
+                            timeout=int(self.timeout * 1000),  # milisegundos
+                            client_args={"limits": limits},
+                            async_client_args={"limits": limits},
+                        ),
+                    )
+        return self._client
+
+    def generate(self, prompt, modelname, temperature):
+        response = self.client.models.generate_content(
+            model=modelname,
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=temperature))
+        return response.text
+
+    async def agenerate(self, prompt, modelname, temperature):
+        response = await self.client.aio.models.generate_content(
+            model=modelname,
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=temperature))
+        return response.text
+
+    async def astream(self, prompt, modelname, temperature):
+        stream = await self.client.aio.models.generate_content_stream(
+            model=modelname,
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=temperature))
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend(LLMBackend):
+    """
+    Backend sin red para pruebas. Responde con el texto asociado a la
+    primera clave contenida en el prompt, o con una función si se indica.
+    """
+    name = "fake"
+
+    def __init__(self, responses=None, default="", handler=None):
+        self.responses = responses or {}
+        self.default = default
+        self.handler = handler
+        self.calls = []
+
+    def generate(self, prompt, modelname, temperature):
+        self.calls.append({"prompt": prompt, "modelname": modelname, "temperature": temperature})
+        if self.handler is not None:
+            return self.handler(prompt, modelname, temperature)
+        for key, text in self.responses.items():
+            if key in prompt:
+                return text
+        return self.default
+
+
 class Model:
+    _backends = {}
+    _backends_lock = threading.Lock()
+    _factories = {"gemini": GeminiBackend}
+    _semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+    # Un semáforo por event loop: asyncio.Semaphore queda ligado al loop donde se usa
+    _async_semaphores = {}
+    cache = ResponseCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+    # La caché SQLite ya es compartida entre procesos: el L1 no necesita otro L2
+    local_cache = TieredCache("llm", LLM_CACHE_L1_BYTES, timeout=LLM_CACHE_TTL)
+    # Prompts idénticos en paralelo comparten una sola llamada al proveedor
+    _flight = SingleFlight()
+    _async_flight = AsyncSingleFlight()
+
+    @classmethod
+    def get_backend(cls, provider):
+        backend = cls._backends.get(provider)
+        if backend is None:
+            with cls._backends_lock:
+                backend = cls._backends.get(provider)
+                if backend is None:
+                    if provider not in cls._factories:
+                        raise ValueError(f"Proveedor de LLM no disponible: {provider}")
+                    backend = cls._factories[provider]()
+                    cls._backends[provider] = backend
+        return backend
+
+    @classmethod
+    def use_backend(cls, provider, backend):
+        """Reemplaza el backend de un proveedor (p. ej. FakeBackend sin red)"""
+        with cls._backends_lock:
+            if backend is None:
+                cls._backends.pop(provider, None)
+            else:
+                cls._backends[provider] = backend
+
+    @classmethod
+    def _cache_key(cls, provider, prompt, modelname, temperature):
+        """Clave de caché, o None si la llamada no debe cachearse"""
+        if not LLM_CACHE_ENABLED:
+            return None
+        if temperature > LLM_CACHE_MAX_TEMPERATURE:
+            cls.cache.record_bypass()
+            return None
+        return cls.cache.make_key(f"{provider}:{modelname}", prompt)
+
+    @classmethod
+    def cache_stats(cls):
+        return cls.cache.stats()
+
+    @classmethod
+    def _cached(cls, key):
+        text = cls.local_cache.get(key)
+        if text is not None:
+            # cache_stats() sigue contando todos los aciertos, de L1 o de SQLite
+            cls.cache.record_hit()
+            return text
+        text = cls.cache.get(key)
+        if text is not None:
+            cls.local_cache.set(key, text)
+        return text
+
+    @classmethod
+    def _store(cls, key, provider, modelname, text):
+        cls.local_cache.set(key, text)
+        cls.cache.set(key, f"{provider}:{modelname}", text)
+
+    @classmethod
+    def flight_stats(cls):
+        return {"sync": cls._flight.stats(), "async": cls._async_flight.stats()}
+
+    @classmethod
+    def _flight_key(cls, provider, prompt, modelname, temperature):
+        return cls.cache.make_key(f"{provider}:{modelname}@{temperature}", prompt)
+
+    @classmethod
+    def generate(cls, provider, prompt, modelname, temperature=0.2):
+        key = cls._cache_key(provider, prompt, modelname, temperature)
+        if key is not None:
+            cached = cls._cached(key)
+            if cached is not None:
+                return cached
+        return cls._flight.do(
+            cls._flight_key(provider, prompt, modelname, temperature),
+            lambda: cls._generate(provider, prompt, modelname, temperature, key),
+        )
+
+    @classmethod
+    def _generate(cls, provider, prompt, modelname, temperature, key):
+        if not cls._semaphore.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise TimeoutError(f"Demasiadas solicitudes concurrentes a {provider}")
+        try:
+            text = cls.get_backend(provider).generate(prompt, modelname, temperature)
+        finally:
+            cls._semaphore.release()
+        if key is not None and text:
+            cls._store(key, provider, modelname, text)
+        return text
+
+    @classmethod
+    async def _acquire_async(cls, provider):
+        """Toma un lugar en el semáforo del loop actual y lo devuelve para liberarlo"""
+        loop = asyncio.get_running_loop()
+        with cls._backends_lock:
+            entry = cls._async_semaphores.get(id(loop))
+            if entry is None or entry[0] is not loop:
+                # Se descartan los semáforos de loops ya cerrados
+                for key, (other, _) in list(cls._async_semaphores.items()):
+                    if other.is_closed():
+                        del cls._async_semaphores[key]
+                entry = cls._async_semaphores[id(loop)] = (loop, asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+            semaphore = entry[1]
+        try:
+            await asyncio.wait_for(semaphore.acquire(), LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Demasiadas solicitudes concurrentes a {provider}")
+        return semaphore
+
+    @classmethod
+    async def agenerate(cls, provider, prompt, modelname, temperature=0.2):
+        key = cls._cache_key(provider, prompt, modelname, temperature)
+        if key is not None:
+            cached = cls._cached(key)
+            if cached is not None:
+                return cached
+        return await cls._async_flight.do(
+            cls._flight_key(provider, prompt, modelname, temperature),
+            lambda: cls._agenerate(provider, prompt, modelname, temperature, key),
+        )
+
+    @classmethod
+    async def _agenerate(cls, provider, prompt, modelname, temperature, key):
+        semaphore = await cls._acquire_async(provider)
+        try:
+            text = await cls.get_backend(provider).agenerate(prompt, modelname, temperature)
+        finally:
+            semaphore.release()
+        if key is not None and text:
+            cls._store(key, provider, modelname, text)
+        return text
+
+    @classmethod
+    async def astream(cls, provider, prompt, modelname, temperature=0.2):
+        """Genera la respuesta como una secuencia de fragmentos de texto"""
+        key = cls._cache_key(provider, prompt, modelname, temperature)
+        if key is not None:
+            cached = cls._cached(key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        semaphore = await cls._acquire_async(provider)
+        try:
+            async for chunk in cls.get_backend(provider).astream(prompt, modelname, temperature):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            semaphore.release()
+        if key is not None and chunks:
+            cls._store(key, provider, modelname, "".join(chunks))
+
     @staticmethod
     def gemini(prompt,modelname="gemini-2.0-flash", temperature=0.2):
         try:
-            client = Client(api_key=os.getenv('GEMINI_API_KEY'))
-            response = client.models.generate_content(
-                model=modelname,
-                contents=prompt)
-            return response.text
+            return Model.generate("gemini", prompt, modelname, temperature)
         except Exception as e:
             raise Exception(f"Error in gemini method: {str(e)}")
-    def gpt(self, modelname, prompt, temperature=0.2):
+
+    @staticmethod
+    async def agemini(prompt, modelname="gemini-2.0-flash", temperature=0.2):
+        try:
+            return await Model.agenerate("gemini", prompt, modelname, temperature)
+        except Exception as e:
+            raise Exception(f"Error in agemini method: {str(e)}")
+
+    @staticmethod
+    async def astream_gemini(prompt, modelname="gemini-2.0-flash", temperature=0.2):
         try:
-            pass
+            async for chunk in Model.astream("gemini", prompt, modelname, temperature):
+                yield chunk
         except Exception as e:
-            raise Exception(f"Error in gpt method: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error in astream_gemini method: {str(e)}")
+
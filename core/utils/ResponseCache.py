@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent.parent / 'cache' / 'llm_responses.sqlite3'
+
+
+class ResponseCache:
+    """
+    Caché de respuestas de LLM direccionada por contenido (modelo + prompt
+    normalizado). Vive en un archivo SQLite local, así que la comparten
+    todos los procesos de la máquina. Expira por TTL y desaloja por LRU.
+    """
+
+    def __init__(self, path=None, ttl=3600, max_entries=5000):
+        self.path = str(path or DEFAULT_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT, created REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(modelname, prompt):
+        normalized = " ".join(str(prompt).split())
+        return hashlib.sha256(f"{modelname}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def record_hit(self):
+        """Acierto resuelto antes de llegar a SQLite (la caché en memoria del proceso)"""
+        self._count("hits")
+
+    def get(self, key):
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+        self._count("hits" if row is not None else "misses")
+        return row[0] if row is not None else None
+
+    def set(self, key, modelname, value):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, modelname, value, now, now),
+            )
+            # Desalojo LRU y limpieza de entradas vencidas
+            conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        try:
+            entries = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: la primera ejecuta la
+    función y las demás esperan y reciben el mismo resultado (o excepción).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def background(self, key, fn) -> bool:
+        """Lanza fn en un hilo si no hay otra ejecución en curso para la clave"""
+        if self.in_flight(key):
+            return False
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception:
+                pass
+
+        threading.Thread(target=run, daemon=True, name=f"single-flight-{key}").start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"in_flight": in_flight, "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight:
+    """
+    Versión para corrutinas. Cada event loop tiene sus propias llamadas en
+    curso; cancelar a quien espera no cancela la llamada compartida.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(flight_key)
+            if task is None:
+                task = loop.create_task(factory())
+                self._tasks[flight_key] = task
+                task.add_done_callback(lambda _: self._forget(flight_key, task))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key, task):
+        with self._lock:
+            if self._tasks.get(flight_key) is task:
+                del self._tasks[flight_key]
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._tasks)
+        return {"in_flight": in_flight, "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,182 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def sizeof(value) -> int:
+    """Tamaño aproximado en bytes de un valor cacheado"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return int(getattr(usage, "sum", lambda: usage)())
+        except TypeError:
+            pass
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class TieredCache:
+    """
+    Caché en dos niveles para un espacio de nombres (datasets, llm, reports).
+    L1 vive en el proceso y devuelve el mismo objeto que se guardó, sin
+    pickle: los valores se tratan como inmutables. Desaloja por LRU cuando
+    los bytes superan l1_bytes. L2 es un backend de django.core.cache
+    compartido entre procesos (alias en CACHES); un acierto en L2 sube a L1.
+    """
+
+    def __init__(self, namespace: str, l1_bytes: int, l2=None, timeout=None):
+        self.namespace = namespace
+        self.l1_bytes = int(l1_bytes)
+        self.l2_alias = l2
+        self.timeout = timeout
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(("l1_hits", "l2_hits", "misses", "sets", "evictions", "l2_errors"), 0)
+        _namespaces[namespace] = self
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _l2(self):
+        if self.l2_alias is None:
+            return None
+        from django.core.cache import caches
+        return caches[self.l2_alias]
+
+    def _l2_key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self._counts["l1_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._bytes -= size
+        value = _MISSING
+        backend = self._l2()
+        if backend is not None:
+            try:
+                value = backend.get(self._l2_key(key), _MISSING)
+            except Exception:
+                self._count("l2_errors")
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("l2_hits")
+        self._store(key, value, sizeof(value), self.timeout)
+        return value
+
+    def set(self, key, value, size=None, timeout=_MISSING):
+        """Guarda en ambos niveles; timeout (segundos) por defecto el del espacio de nombres"""
+        timeout = self.timeout if timeout is _MISSING else timeout
+        self._count("sets")
+        self._store(key, value, sizeof(value) if size is None else size, timeout)
+        backend = self._l2()
+        if backend is not None:
+            try:
+                backend.set(self._l2_key(key), value, timeout)
+            except Exception:
+                self._count("l2_errors")
+
+    def get_or_set(self, key, builder, size=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = builder()
+            self.set(key, value, size)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        backend = self._l2()
+        if backend is not None:
+            try:
+                backend.delete(self._l2_key(key))
+            except Exception:
+                self._count("l2_errors")
+
+    def _store(self, key, value, size: int, timeout):
+        # Un valor más grande que todo L1 solo queda en L2
+        if size > self.l1_bytes:
+            return
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while self._bytes > self.l1_bytes and len(self._entries) > 1:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._counts["evictions"] += 1
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            entries, used = len(self._entries), self._bytes
+        lookups = counts["l1_hits"] + counts["l2_hits"] + counts["misses"]
+        hits = counts["l1_hits"] + counts["l2_hits"]
+        return {
+            **counts,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "l1_entries": entries,
+            "l1_bytes": used,
+            "l1_budget": self.l1_bytes,
+            "l2": self.l2_alias,
+        }
+
+
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def get_cache(namespace: str) -> TieredCache:
+    """Caché del espacio de nombres configurada en settings.TIERED_CACHES"""
+    cache = _namespaces.get(namespace)
+    if cache is not None:
+        return cache
+    from django.conf import settings
+    options = getattr(settings, "TIERED_CACHES", {}).get(namespace, {})
+    with _namespaces_lock:
+        cache = _namespaces.get(namespace)
+        if cache is None:
+            cache = TieredCache(
+                namespace,
+                l1_bytes=options.get("L1_BYTES", 16 * 1024 * 1024),
+                l2=options.get("L2"),
+                timeout=options.get("TIMEOUT"),
+            )
+    return cache
+
+
+def tiered_cache_stats():
+    return {namespace: cache.stats() for namespace, cache in sorted(_namespaces.items())}
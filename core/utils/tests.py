@@ -0,0 +1,246 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .ModelsApi import FakeBackend, Model
+from .ResponseCache import ResponseCache
+from .SingleFlight import AsyncSingleFlight, SingleFlight
+from .TieredCache import TieredCache
+
+# Create your tests here.
+L2_CACHES = {"l2": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tiered-tests"}}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        time.sleep(0.005)
+
+
+class SingleFlightTests(SimpleTestCase):
+    followers = 4
+
+    def run_concurrently(self, flight, fn):
+        """Lanza un líder y varios seguidores con la misma clave; fn espera a que todos lleguen"""
+        outcomes = []
+        lock = threading.Lock()
+
+        def call():
+            try:
+                result = flight.do("clave", fn)
+            except Exception as e:
+                result = e
+            with lock:
+                outcomes.append(result)
+
+        threads = [threading.Thread(target=call) for _ in range(self.followers + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            wait_until(lambda: flight.coalesced == self.followers)
+            return "resultado"
+
+        outcomes = self.run_concurrently(flight, fn)
+        self.assertEqual(calls, [1])
+        self.assertEqual(outcomes, ["resultado"] * (self.followers + 1))
+        self.assertEqual(flight.stats(), {"in_flight": 0, "leaders": 1, "coalesced": self.followers})
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        def fn():
+            wait_until(lambda: flight.coalesced == self.followers)
+            raise RuntimeError("proveedor caído")
+
+        outcomes = self.run_concurrently(flight, fn)
+        self.assertEqual(len(outcomes), self.followers + 1)
+        self.assertTrue(all(isinstance(outcome, RuntimeError) for outcome in outcomes))
+        # La clave se libera: la siguiente llamada vuelve a ejecutar la función
+        self.assertEqual(flight.do("clave", lambda: "otra vez"), "otra vez")
+
+    def test_async_callers_share_one_task(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "resultado"
+
+        async def main():
+            return await asyncio.gather(*(flight.do("clave", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["resultado"] * 5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(flight.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 4})
+
+    def test_async_errors_reach_every_caller(self):
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("proveedor caído")
+
+        async def main():
+            return await asyncio.gather(*(flight.do("clave", fail) for _ in range(3)), return_exceptions=True)
+
+        outcomes = asyncio.run(main())
+        self.assertTrue(all(isinstance(outcome, RuntimeError) for outcome in outcomes))
+        self.assertEqual(flight.stats()["leaders"], 1)
+
+
+@override_settings(CACHES=L2_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        caches["l2"].clear()
+
+    def test_l1_evicts_least_recently_used_by_bytes(self):
+        cache = TieredCache("tests-lru", l1_bytes=30)
+        cache.set("a", b"x" * 10)
+        cache.set("b", b"x" * 10)
+        cache.get("a")
+        cache.set("c", b"x" * 15)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"x" * 10)
+        self.assertEqual(cache.get("c"), b"x" * 15)
+        stats = cache.stats()
+        self.assertEqual((stats["evictions"], stats["l1_entries"], stats["l1_bytes"]), (1, 2, 25))
+
+    def test_value_larger_than_l1_is_not_kept_locally(self):
+        cache = TieredCache("tests-large", l1_bytes=10)
+        cache.set("grande", b"x" * 11)
+        self.assertIsNone(cache.get("grande"))
+        self.assertEqual(cache.stats()["l1_entries"], 0)
+
+    def test_l2_hit_is_promoted_to_l1(self):
+        writer = TieredCache("tests-shared", l1_bytes=1024, l2="l2")
+        writer.set("clave", "valor")
+        # Otro proceso: mismo espacio de nombres, L1 vacío
+        reader = TieredCache("tests-shared", l1_bytes=1024, l2="l2")
+        self.assertEqual(reader.get("clave"), "valor")
+        self.assertEqual(reader.get("clave"), "valor")
+        stats = reader.stats()
+        self.assertEqual((stats["l2_hits"], stats["l1_hits"], stats["misses"]), (1, 1, 0))
+
+    def test_entries_expire_after_timeout(self):
+        cache = TieredCache("tests-ttl", l1_bytes=1024, timeout=10)
+        with mock.patch("core.utils.TieredCache.time.monotonic", return_value=100.0):
+            cache.set("clave", "valor")
+        with mock.patch("core.utils.TieredCache.time.monotonic", return_value=109.0):
+            self.assertEqual(cache.get("clave"), "valor")
+        with mock.patch("core.utils.TieredCache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("clave"))
+        self.assertEqual(cache.stats()["l1_entries"], 0)
+
+    def test_l2_errors_fall_back_to_a_miss(self):
+        broken = mock.Mock()
+        broken.get.side_effect = broken.set.side_effect = broken.delete.side_effect = OSError("disco lleno")
+        cache = TieredCache("tests-errors", l1_bytes=1024, l2="l2")
+        with mock.patch.object(cache, "_l2", return_value=broken):
+            cache.set("clave", "valor")
+            self.assertEqual(cache.get("clave"), "valor")
+            cache.delete("clave")
+            self.assertEqual(cache.get_or_set("clave", lambda: "nuevo"), "nuevo")
+        stats = cache.stats()
+        self.assertEqual((stats["l2_errors"], stats["misses"], stats["l1_hits"]), (4, 1, 1))
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.path = tmp / "llm.sqlite3"
+
+    def at(self, moment):
+        return mock.patch("core.utils.ResponseCache.time.time", return_value=moment)
+
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(self.path, ttl=60)
+        with self.at(1000):
+            cache.set("clave", "gemini:flash", "respuesta")
+        with self.at(1059):
+            self.assertEqual(cache.get("clave"), "respuesta")
+        with self.at(1061):
+            self.assertIsNone(cache.get("clave"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_read(self):
+        cache = ResponseCache(self.path, ttl=3600, max_entries=2)
+        with self.at(1000):
+            cache.set("a", "m", "A")
+        with self.at(1001):
+            cache.set("b", "m", "B")
+        with self.at(1002):
+            cache.get("a")
+        with self.at(1003):
+            cache.set("c", "m", "C")
+            self.assertEqual([cache.get(key) for key in "abc"], ["A", None, "C"])
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_key_ignores_whitespace_but_not_the_model(self):
+        key = ResponseCache.make_key("gemini:flash", "hola  mundo\n")
+        self.assertEqual(key, ResponseCache.make_key("gemini:flash", " hola mundo"))
+        self.assertNotEqual(key, ResponseCache.make_key("gemini:pro", "hola mundo"))
+
+
+class ModelCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.cache = ResponseCache(tmp / "llm.sqlite3")
+        self.local = TieredCache("tests-llm", l1_bytes=1024 * 1024)
+        for patcher in (
+            mock.patch.object(Model, "cache", self.cache),
+            mock.patch.object(Model, "local_cache", self.local),
+            mock.patch("core.utils.ModelsApi.LLM_CACHE_ENABLED", True),
+            mock.patch("core.utils.ModelsApi.LLM_CACHE_MAX_TEMPERATURE", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.llm = FakeBackend(default="respuesta")
+        Model.use_backend("gemini", self.llm)
+        self.addCleanup(Model.use_backend, "gemini", None)
+
+    def test_positive_temperature_bypasses_the_cache(self):
+        for _ in range(2):
+            self.assertEqual(Model.gemini("prompt", temperature=0.7), "respuesta")
+        self.assertEqual(len(self.llm.calls), 2)
+        stats = Model.cache_stats()
+        self.assertEqual((stats["bypassed"], stats["hits"], stats["misses"], stats["entries"]), (2, 0, 0, 0))
+
+    def test_hits_are_counted_in_memory_and_in_sqlite(self):
+        Model.gemini("prompt", temperature=0)
+        Model.gemini("prompt", temperature=0)
+        # Otro proceso: L1 vacío, la respuesta sale de SQLite
+        self.local.clear_local()
+        Model.gemini("prompt", temperature=0)
+        self.assertEqual(len(self.llm.calls), 1)
+        stats = Model.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (2, 1, 0.6667))
+        self.assertEqual(self.local.stats()["l1_hits"], 1)
+
+    def test_async_calls_share_the_cache(self):
+        async def main():
+            return [await Model.agemini("prompt", temperature=0) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(main()), ["respuesta"] * 3)
+        self.assertEqual(len(self.llm.calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))